@@ -2,7 +2,54 @@ import heapq
 import math
 import sys
 import queue
+from collections import OrderedDict
 from .util import debug_write
+from .game_map import _TILE_X, _TILE_Y, _TILE_ID, _TILE_COUNT, _HALF_ARENA, _MIRROR_TILE, _bits_to_bytes, _mirror_bits
+
+def _build_neighbor_table():
+    """For every tile id, the ids of its on-board neighbors.
+    Neighbors are listed in the same order as ShortestPathFinder._get_neighbors
+    (up, down, right, left), which the tie-breaking rules depend on.
+    """
+    neighbors = []
+    for tile in range(_TILE_COUNT):
+        x, y = _TILE_X[tile], _TILE_Y[tile]
+        tile_neighbors = []
+        for nx, ny in [[x, y + 1], [x, y - 1], [x + 1, y], [x - 1, y]]:
+            if 0 <= nx < len(_TILE_ID) and 0 <= ny < len(_TILE_ID) and _TILE_ID[nx][ny] >= 0:
+                tile_neighbors.append(_TILE_ID[nx][ny])
+        neighbors.append(tuple(tile_neighbors))
+    return tuple(neighbors)
+
+_NEIGHBORS = _build_neighbor_table()
+
+# Above this many changed tiles, a fresh search is cheaper than updating an old distance field
+_MAX_INCREMENTAL_CHANGES = 8
+
+class _LRUCache:
+    """A small mapping that evicts its least recently used entry when full
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
 
 class Node:
     """A pathfinding node
@@ -23,7 +70,8 @@ class Node:
 """
 This class helps with pathfinding. We guarantee the results will
 be accurate, but top players may want to write their own pathfinding
-code to maximise time efficiency
+code to maximise time efficiency. It is kept as the reference implementation,
+GameState uses the equivalent FastShortestPathFinder below.
 """
 class ShortestPathFinder:
     """Handles pathfinding
@@ -71,10 +119,10 @@ class ShortestPathFinder:
         #Initialize map 
         self.initialize_map(game_state)
         #Fill in walls
-        for location in self.game_state.game_map:
-            if self.game_state.contains_stationary_unit(location):
-                self.game_map[location[0]][location[1]].blocked = True
+        for location in self.game_state.game_map.get_locations_from_bits(self.game_state.game_map.get_structure_bits()):
+            self.game_map[location[0]][location[1]].blocked = True
         #Do pathfinding
+        self._end_point_set = set((x, y) for x, y in end_points)
         ideal_endpoints = self._idealness_search(start_point, end_points)
         self._validate(ideal_endpoints, end_points)
         return self._get_path(start_point, end_points)
@@ -141,7 +189,7 @@ class ShortestPathFinder:
         Returns:
             A location the unit will attempt to reach
         """
-        if location in end_points:
+        if (location[0], location[1]) in self._end_point_set:
             return sys.maxsize
 
         direction = self._get_direction_from_endpoints(end_points)
@@ -314,3 +362,493 @@ class ShortestPathFinder:
             sys.stderr.write(" ")
         sys.stderr.write(str(number))
         sys.stderr.write(" ")
+
+
+class FastShortestPathFinder:
+    """Handles pathfinding using flat arrays indexed by tile id.
+
+    Returns exactly the same paths as ShortestPathFinder, including its tie-breaking rules,
+    but works on precomputed neighbor tables instead of building a grid of Node objects
+    and [x, y] lists for every query.
+
+    A distance field only depends on the blocked tiles and the tiles it is searched from,
+    not on the start location, so fields are kept in a least recently used cache keyed by
+    (structure occupancy, target tiles). Repeated queries against an unchanged board only
+    cost a walk along the path. When only a few tiles changed since the last query, for example
+    after GameState.attempt_spawn or GameMap.add_unit, the previous field is updated around the
+    changed tiles instead of searching the whole board again.
+
+    The arena is left-right symmetric, so the field for a board and an edge is the reflection of the
+    field for the reflected board and the opposite edge. If the reflected query is cached, for example
+    [14, 0] to TOP_LEFT after [13, 0] to TOP_RIGHT on a mirror symmetric layout, its field is reflected
+    instead of searched. Paths are still walked on the reflected field, so tie-breaking is unchanged.
+
+    Attributes :
+        * HORIZONTAL (int): A constant representing a horizontal movement
+        * VERTICAL (int): A constant representing a vertical movement
+
+        * game_state (:obj: GameState): The gamestate of the last query
+
+    """
+    def __init__(self, cache_size=64):
+        """
+        Args:
+            cache_size: The number of distance fields kept in the cache
+        """
+        self.HORIZONTAL = 1
+        self.VERTICAL = 2
+        self.initialized = False
+        self._unset = [-1] * _TILE_COUNT
+        self._pathlength = self._unset
+        self._blocked = bytearray(_TILE_COUNT)
+        self._occupancy = 0
+        self._mirrored_occupancy = 0
+        self._visited = bytearray(_TILE_COUNT)
+        self._field_cache = _LRUCache(cache_size)
+        self._ideal_cache = _LRUCache(cache_size)
+        self._latest_fields = _LRUCache(cache_size)
+
+    def initialize_map(self, game_state, occupancy=None):
+        """Initializes the map, marking every tile that holds a structure as blocked
+
+        Args:
+            game_state: A GameState object representing the gamestate we want to traverse
+            occupancy: A bitboard of blocked tiles to use instead of the structures on the map, see GameMap.get_structure_bits
+        """
+        self.initialized = True
+        self.game_state = game_state
+        if occupancy is None:
+            occupancy = game_state.game_map.get_structure_bits()
+        changed = occupancy ^ self._occupancy
+        if not changed:
+            return
+        if bin(changed).count("1") > _MAX_INCREMENTAL_CHANGES:
+            self._blocked[:] = _bits_to_bytes(occupancy)
+        else:
+            while changed:
+                lowest_bit = changed & -changed
+                changed ^= lowest_bit
+                tile = lowest_bit.bit_length() - 1
+                self._blocked[tile] = not self._blocked[tile]
+        self._occupancy = occupancy
+        self._mirrored_occupancy = None
+
+    def _get_mirrored_occupancy(self):
+        """Gets the occupancy of the current board reflected across the center line"""
+        if self._mirrored_occupancy is None:
+            self._mirrored_occupancy = _mirror_bits(self._occupancy)
+        return self._mirrored_occupancy
+
+    def clear_cache(self):
+        """Forgets every cached distance field"""
+        self._field_cache.clear()
+        self._ideal_cache.clear()
+        self._latest_fields.clear()
+
+    def navigate_multiple_endpoints(self, start_point, end_points, game_state):
+        """Finds the path a unit would take to reach a set of endpoints
+
+        Args:
+            * start_point: The starting location of the unit
+            * end_points: The end points of the unit, should be a list of edge locations
+            * game_state: The current game state
+
+        Returns:
+            The path a unit at start_point would take when trying to reach end_points given the current game state.
+            Note that this path can change if a tower is destroyed during pathing, or if you or your enemy places structures.
+
+        """
+        if game_state.contains_stationary_unit(start_point):
+            return
+
+        self.initialize_map(game_state)
+        return self._navigate(start_point, self._get_end_ids(end_points, game_state), end_points)
+
+    def navigate_multiple_starts(self, start_points, end_points, game_state, occupancy=None):
+        """Finds the paths units at several start points would take to reach the same set of endpoints.
+        The board is only read once, and every start shares the same distance field.
+
+        Args:
+            * start_points: The starting locations of the units
+            * end_points: The end points of the units, should be a list of edge locations
+            * game_state: The current game state
+            * occupancy: A bitboard of blocked tiles to path around instead of the structures on the map.
+              Used to query hypothetical boards without changing the map.
+
+        Returns:
+            A list with the path for each start point, in order. The entry is None for start points holding a structure.
+
+        """
+        self.initialize_map(game_state, occupancy)
+        end_ids = self._get_end_ids(end_points, game_state)
+        paths = []
+        for start_point in start_points:
+            if not game_state.game_map.in_arena_bounds(start_point) or self._blocked[_TILE_ID[start_point[0]][start_point[1]]]:
+                paths.append(None)
+            else:
+                paths.append(self._navigate(start_point, end_ids, end_points))
+        return paths
+
+    def navigate_tiles(self, start, end_tiles, game_state):
+        """Like navigate_multiple_endpoints, with the locations given and returned as tile ids (see GameMap.get_tile_id)
+
+        Args:
+            * start: The tile id of the starting location of the unit
+            * end_tiles: The tile ids of the end points of the unit, should be the tiles of an edge
+            * game_state: The current game state
+
+        Returns:
+            A list of the tile ids of the path, or None if start is off the board or holds a structure
+
+        """
+        self.initialize_map(game_state)
+        if not 0 <= start < _TILE_COUNT or self._blocked[start]:
+            return
+        end_ids = tuple(end_tiles)
+        return self._navigate_tiles(start, end_ids, self._get_direction_from_endpoints([[_TILE_X[end_ids[0]], _TILE_Y[end_ids[0]]]]))
+
+    def _get_end_ids(self, end_points, game_state):
+        """Gets the tile ids of the on-board endpoints
+        """
+        return tuple(_TILE_ID[x][y] for x, y in end_points if game_state.game_map.in_arena_bounds([x, y]))
+
+    def _navigate(self, start_point, end_ids, end_points):
+        """Finds a path on the board loaded by initialize_map
+        """
+        tiles = self._navigate_tiles(_TILE_ID[start_point[0]][start_point[1]], end_ids, self._get_direction_from_endpoints(end_points))
+        path = [start_point]
+        for tile in tiles[1:]:
+            path.append([_TILE_X[tile], _TILE_Y[tile]])
+        return path
+
+    def _navigate_tiles(self, start, end_ids, direction):
+        """Finds the tile ids of a path on the board loaded by initialize_map
+        """
+        pathlength = self._get_distance_field(end_ids)
+        if pathlength[start] == -1:
+            # No endpoint is reachable, so the unit paths to its best self destruct location instead
+            ideal_tile = self._get_ideal_tile(start, end_ids, direction)
+            pathlength = self._get_distance_field((ideal_tile,))
+        self._pathlength = pathlength
+        return self._get_path(start, direction)
+
+    def _get_distance_field(self, targets):
+        """Gets the pathlength of every tile to the closest of the target tiles, from the cache if possible
+        """
+        key = (self._occupancy, targets)
+        pathlength = self._field_cache.get(key)
+        if pathlength is None:
+            pathlength = self._reflect_cached_field(targets)
+            if pathlength is None:
+                pathlength = self._update_latest_field(targets)
+            if pathlength is None:
+                pathlength = self._validate(targets)
+            self._field_cache.put(key, pathlength)
+        self._latest_fields.put(targets, (self._occupancy, pathlength))
+        return pathlength
+
+    def _reflect_cached_field(self, targets):
+        """Gets the distance field by reflecting the cached field of the mirrored query, if there is one
+        """
+        mirrored_targets = tuple(_MIRROR_TILE[tile] for tile in targets)
+        mirrored = self._field_cache.get((self._get_mirrored_occupancy(), mirrored_targets))
+        if mirrored is None:
+            return None
+        return [mirrored[tile] for tile in _MIRROR_TILE]
+
+    def _update_latest_field(self, targets):
+        """Derives the distance field for the current board from the most recent field for the same targets.
+
+        Returns:
+            The updated field, or None if there is no recent field or too many tiles changed since
+        """
+        latest = self._latest_fields.get(targets)
+        if latest is None:
+            return None
+        occupancy, pathlength = latest
+        changed = occupancy ^ self._occupancy
+        if bin(changed).count("1") > _MAX_INCREMENTAL_CHANGES:
+            return None
+
+        pathlength = list(pathlength)
+        blocked = bytearray(_bits_to_bytes(occupancy))
+        while changed:
+            lowest_bit = changed & -changed
+            changed ^= lowest_bit
+            tile = lowest_bit.bit_length() - 1
+            blocked[tile] = not blocked[tile]
+            if blocked[tile]:
+                self._block_tile(pathlength, blocked, tile, targets)
+            else:
+                self._unblock_tile(pathlength, blocked, tile, targets)
+        return pathlength
+
+    def _block_tile(self, pathlength, blocked, tile, targets):
+        """Updates a distance field after a tile became blocked.
+        Only the tiles whose shortest routes all went through that tile are searched again.
+        """
+        old_length = pathlength[tile]
+        if tile not in targets:
+            pathlength[tile] = -1
+        if old_length == -1:
+            return
+
+        # Walk outwards level by level, collecting the tiles left without a neighbor one step closer
+        affected = set()
+        level = [neighbor for neighbor in _NEIGHBORS[tile] if pathlength[neighbor] == old_length + 1]
+        while level:
+            next_level = []
+            for current in level:
+                if current in affected:
+                    continue
+                length = pathlength[current]
+                supported = False
+                for neighbor in _NEIGHBORS[current]:
+                    if pathlength[neighbor] == length - 1 and not blocked[neighbor] and neighbor not in affected:
+                        supported = True
+                        break
+                if supported:
+                    continue
+                affected.add(current)
+                for neighbor in _NEIGHBORS[current]:
+                    if pathlength[neighbor] == length + 1:
+                        next_level.append(neighbor)
+            level = next_level
+
+        for current in affected:
+            pathlength[current] = -1
+
+        # Reattach the affected tiles to their unaffected border, closest first
+        buckets = {}
+        for current in affected:
+            best = -1
+            for neighbor in _NEIGHBORS[current]:
+                length = pathlength[neighbor]
+                if not length == -1 and not blocked[neighbor] and (best == -1 or length + 1 < best):
+                    best = length + 1
+            if not best == -1:
+                buckets.setdefault(best, []).append(current)
+        if not buckets:
+            return
+        length = min(buckets)
+        last_length = max(buckets)
+        while length <= last_length:
+            for current in buckets.get(length, ()):
+                if not pathlength[current] == -1:
+                    continue
+                pathlength[current] = length
+                for neighbor in _NEIGHBORS[current]:
+                    if neighbor in affected and pathlength[neighbor] == -1:
+                        buckets.setdefault(length + 1, []).append(neighbor)
+                        last_length = max(last_length, length + 1)
+            length += 1
+
+    def _unblock_tile(self, pathlength, blocked, tile, targets):
+        """Updates a distance field after a tile became pathable, searching outwards from it
+        only as far as it shortens other tiles' pathlengths.
+        """
+        if tile in targets:
+            pathlength[tile] = 0
+        else:
+            best = -1
+            for neighbor in _NEIGHBORS[tile]:
+                length = pathlength[neighbor]
+                if not length == -1 and not blocked[neighbor] and (best == -1 or length + 1 < best):
+                    best = length + 1
+            pathlength[tile] = best
+            if best == -1:
+                return
+
+        frontier = [tile]
+        for current in frontier:
+            next_length = pathlength[current] + 1
+            for neighbor in _NEIGHBORS[current]:
+                if not blocked[neighbor] and (pathlength[neighbor] == -1 or pathlength[neighbor] > next_length):
+                    pathlength[neighbor] = next_length
+                    frontier.append(neighbor)
+
+    def _get_ideal_tile(self, start, end_ids, direction):
+        """Gets the most ideal tile of the pocket containing start, from the cache if possible
+        """
+        key = (self._occupancy, end_ids, direction[0], direction[1])
+        ideal_tiles = self._ideal_cache.get(key)
+        if ideal_tiles is None:
+            ideal_tiles = {}
+            self._ideal_cache.put(key, ideal_tiles)
+        if start not in ideal_tiles:
+            mirrored_key = (self._get_mirrored_occupancy(), tuple(_MIRROR_TILE[tile] for tile in end_ids), -direction[0], direction[1])
+            mirrored_tiles = self._ideal_cache.get(mirrored_key)
+            if mirrored_tiles is not None and _MIRROR_TILE[start] in mirrored_tiles:
+                ideal_tiles[start] = _MIRROR_TILE[mirrored_tiles[_MIRROR_TILE[start]]]
+            else:
+                pocket, most_ideal = self._idealness_search(start, direction)
+                for tile in pocket:
+                    ideal_tiles[tile] = most_ideal
+        return ideal_tiles[start]
+
+    def _idealness_search(self, start, direction):
+        """
+        Finds the most ideal tile in our 'pocket' of pathable space, when no endpoint can be reached.
+        That is the best self destruct location.
+
+        Returns:
+            The tiles of the pocket and the most ideal tile among them
+        """
+        # Idealness of a non-endpoint tile is unique, so the most ideal tile does not depend on search order
+        row_weight = 28 if direction[1] == 1 else -28
+        column_weight = 1 if direction[0] == 1 else -1
+
+        blocked = self._blocked
+        visited = self._visited
+        visited[:] = bytes(_TILE_COUNT)
+        visited[start] = True
+        best_idealness = row_weight * _TILE_Y[start] + column_weight * _TILE_X[start]
+        most_ideal = start
+        pocket = [start]
+        for tile in pocket:
+            for neighbor in _NEIGHBORS[tile]:
+                if visited[neighbor] or blocked[neighbor]:
+                    continue
+                visited[neighbor] = True
+                pocket.append(neighbor)
+                idealness = row_weight * _TILE_Y[neighbor] + column_weight * _TILE_X[neighbor]
+                if idealness > best_idealness:
+                    best_idealness = idealness
+                    most_ideal = neighbor
+        return pocket, most_ideal
+
+    def _get_direction_from_endpoints(self, end_points):
+        """Gets the direction of a set of endpoints
+
+        Args:
+            * end_points: A set of endpoints, should be an edge
+
+        Returns:
+            A direction [x,y] representing the edge. For example, [1,1] for the top right and [-1, 1] for the top left
+
+        """
+        x, y = end_points[0]
+        direction = [1, 1]
+        if x < _HALF_ARENA:
+            direction[0] = -1
+        if y < _HALF_ARENA:
+            direction[1] = -1
+        return direction
+
+    def _validate(self, targets):
+        """Breadth first search of the grid from the target tiles
+
+        Returns:
+            A new list holding the pathlength of every tile, -1 for tiles that can not reach a target
+
+        """
+        pathlength = list(self._unset)
+        blocked = self._blocked
+
+        for tile in targets:
+            pathlength[tile] = 0
+        frontier = list(targets)
+        for tile in frontier:
+            # Blocked endpoints are still targets, but units can not path through them
+            if blocked[tile]:
+                continue
+            next_length = pathlength[tile] + 1
+            for neighbor in _NEIGHBORS[tile]:
+                if pathlength[neighbor] == -1 and not blocked[neighbor]:
+                    pathlength[neighbor] = next_length
+                    frontier.append(neighbor)
+        return pathlength
+
+    def _get_path(self, start, direction):
+        """Once all tiles are validated, and a target is found, the unit can path to its target
+
+        Returns:
+            The tile ids of the path
+
+        """
+        pathlength = self._pathlength
+        path = [start]
+        current = start
+        move_direction = 0
+
+        while not pathlength[current] == 0:
+            next_move = self._choose_next_move(current, move_direction, direction)
+            if _TILE_X[current] == _TILE_X[next_move]:
+                move_direction = self.VERTICAL
+            else:
+                move_direction = self.HORIZONTAL
+            path.append(next_move)
+            current = next_move
+
+        return path
+
+    def _choose_next_move(self, current, previous_move_direction, direction):
+        """Given the current tile and adjacent tiles, return the best 'next step' for a given unit to take
+        """
+        pathlength = self._pathlength
+        blocked = self._blocked
+        ideal_neighbor = current
+        best_pathlength = pathlength[current]
+        for neighbor in _NEIGHBORS[current]:
+            if blocked[neighbor]:
+                continue
+
+            current_pathlength = pathlength[neighbor]
+            if current_pathlength > best_pathlength:
+                continue
+            if current_pathlength == best_pathlength and not self._better_direction(current, neighbor, ideal_neighbor, previous_move_direction, direction):
+                continue
+
+            ideal_neighbor = neighbor
+            best_pathlength = current_pathlength
+
+        return ideal_neighbor
+
+    def _better_direction(self, prev_tile, new_tile, prev_best, previous_move_direction, direction):
+        """Compare two tiles and return True if the unit would rather move to the new one.
+        Mirrors ShortestPathFinder._better_direction on tile ids.
+
+        """
+        if previous_move_direction == self.HORIZONTAL and not _TILE_X[new_tile] == _TILE_X[prev_best]:
+            return not _TILE_Y[prev_tile] == _TILE_Y[new_tile]
+        if previous_move_direction == self.VERTICAL and not _TILE_Y[new_tile] == _TILE_Y[prev_best]:
+            return not _TILE_X[prev_tile] == _TILE_X[new_tile]
+        if previous_move_direction == 0:
+            return not _TILE_Y[prev_tile] == _TILE_Y[new_tile]
+
+        #To make it here, both moves are on the same axis
+        if _TILE_Y[new_tile] == _TILE_Y[prev_best]: #If they both moved horizontal...
+            if direction[0] == 1:
+                return _TILE_X[new_tile] > _TILE_X[prev_best]
+            return _TILE_X[new_tile] < _TILE_X[prev_best]
+        if _TILE_X[new_tile] == _TILE_X[prev_best]: #If they both moved vertical...
+            if direction[1] == 1:
+                return _TILE_Y[new_tile] > _TILE_Y[prev_best]
+            return _TILE_Y[new_tile] < _TILE_Y[prev_best]
+        return True
+
+    def print_map(self):
+        """Prints an ASCII version of the current game map for debug purposes
+
+        """
+        if not self.initialized:
+            debug_write("Attempted to print_map before pathfinder initialization. Use 'this_object.initialize_map(game_state)' to initialize the map first")
+            return
+
+        for y in range(28):
+            for x in range(28):
+                tile = _TILE_ID[x][28 - y - 1]
+                if tile >= 0 and not self._blocked[tile] and not self._pathlength[tile] == -1:
+                    self._print_justified(self._pathlength[tile])
+                else:
+                    sys.stderr.write("   ")
+            debug_write("")
+
+    def _print_justified(self, number):
+        """Prints a number between 100 and -10 in 3 spaces
+
+        """
+        if number < 10 and number > -1:
+            sys.stderr.write(" ")
+        sys.stderr.write(str(number))
+        sys.stderr.write(" ")
@@ -1,8 +1,13 @@
+import json
+import re
 import sys
 
 
 BANNER_TEXT = "---------------- Starting Your Algo --------------------"
 
+_DECODER = json.JSONDecoder()
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
 
 def get_command():
     """Gets input from stdin
@@ -39,3 +44,32 @@ def debug_write(*msg):
     #Printing to STDERR is okay and printed out by the game but doesn't effect turns.
     sys.stderr.write(", ".join(map(str, msg)).strip() + "\n")
     sys.stderr.flush()
+
+def decode_keys(message, keys):
+    """Decodes some of the top level keys of a json object without decoding the rest of it
+
+    Each key is found by searching the message, then only its value is decoded.
+    This relies on the keys not also being used by nested objects, which holds for the keys
+    of the messages sent by the game engine (turnInfo, p1Units, events...).
+
+    Args:
+        message: A json object as a string
+        keys: The keys to decode
+
+    Returns:
+        A dict mapping each key found in the message to its decoded value
+
+    """
+    decoded = {}
+    for key in keys:
+        quoted_key = json.dumps(key)
+        start = message.find(quoted_key)
+        while start >= 0:
+            colon = _WHITESPACE.match(message, start + len(quoted_key)).end()
+            if message.startswith(":", colon):
+                value_start = _WHITESPACE.match(message, colon + 1).end()
+                decoded[key], _ = _DECODER.raw_decode(message, value_start)
+                break
+            # The key was matched as a string value, keep looking
+            start = message.find(quoted_key, start + 1)
+    return decoded
@@ -1,4 +1,3 @@
-import json
 import math
 from os import stat
 import random
@@ -24,6 +23,8 @@ Advanced strategy tips:
 class AlgoStrategy(gamelib.AlgoCore):
     def __init__(self):
         super().__init__()
+        self.decoded_messages = True
+        self.frame_keys = ["p1Stats", "p1Units", "events"]
         seed = random.randrange(maxsize)
         random.seed(seed)
         gamelib.debug_write('Random seed: {}'.format(seed))
@@ -585,7 +586,7 @@ class AlgoStrategy(gamelib.AlgoCore):
 
 
 
-    def on_action_frame(self, turn_string):
+    def on_action_frame(self, state):
         """
         This is the action frame of the game. This function could be called
         hundreds of times per turn and could slow the algo down so avoid putting slow code here.
@@ -593,7 +594,6 @@ class AlgoStrategy(gamelib.AlgoCore):
         Full doc on format of a game frame at: https://docs.c1games.com/json-docs.html
         """
         # Let's record at what position we get scored on
-        state = json.loads(turn_string)
 
         # Our turn state stats
         self.health = state["p1Stats"][0]
@@ -718,11 +718,9 @@ class AlgoStrategy(gamelib.AlgoCore):
 
     def detect_enemy_unit(self, game_state, unit_type=None, valid_x = None, valid_y = None):
         total_units = 0
-        for location in game_state.game_map:
-            if game_state.contains_stationary_unit(location):
-                for unit in game_state.game_map[location]:
-                    if unit.player_index == 1 and (unit_type is None or unit.unit_type == unit_type) and (valid_x is None or location[0] in valid_x) and (valid_y is None or location[1] in valid_y):
-                        total_units += 1
+        for unit in game_state.game_map.get_units(1, unit_type, valid_x, valid_y):
+            if unit.stationary:
+                total_units += 1
         return total_units
 
     def thresh_by_round(self, round_num):
@@ -14,7 +14,16 @@ The AlgoCore class in algocore.py handles communication with the game engine, an
 Investigating it is useful for advanced players interested in getting data from the action phase or communicating directly with the game engine. \n
 
 The Navigation class in navigation.py contains functions related to pathfinding, which are used by GameState in pathing related functions. 
-Investigating it is useful for advanced player who want to optimize the slow default pathing algorithm we provide. \n 
+GameState uses FastShortestPathFinder, an array based engine that returns the same paths as the reference ShortestPathFinder. \n 
+
+The ActionSimulator class in simulation.py predicts the action phase of a turn locally, frame by frame, 
+and reports the events the engine would send. It is useful for testing deploy plans before submitting them. \n
+
+The CoverageCalculator class in coverage.py computes how much damage structures can deal on every tile at once. 
+GameState.get_coverage uses it, including for hypothetical boards. \n
+
+codec.py decodes and encodes the json messages exchanged with the game engine, using orjson or ujson when installed 
+and the standard json module otherwise. \n
 
 util.py contains a small handful of functions that help with communication, including the debug-printing function, debug_write().
 """
@@ -24,6 +33,7 @@ from .util import debug_write
 from .game_state import GameState
 from .unit import GameUnit
 from .game_map import GameMap
+from .simulation import ActionSimulator
 
-__all__ = ["algocore", "game_state", "game_map", "navigation", "unit", "util"]
+__all__ = ["algocore", "game_state", "game_map", "navigation", "coverage", "simulation", "unit", "util", "codec"]
  
\ No newline at end of file
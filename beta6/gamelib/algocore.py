@@ -1,7 +1,7 @@
-import json
+from . import codec
 
 from .game_state import GameState
-from .util import get_command, debug_write, BANNER_TEXT, send_command
+from .util import get_command, debug_write, decode_keys, BANNER_TEXT, send_command
 
 class AlgoCore(object):
     """
@@ -10,10 +10,18 @@ class AlgoCore(object):
 
     Attributes :
         * config (JSON): json object containing information about the game
+        * decoded_messages (bool): If True, on_turn and on_action_frame are passed the game state already
+          decoded into a dict instead of the raw json string. Each message is then parsed only once.
+          GameState accepts either form.
+        * frame_keys (list): If set, only these top level keys of each action frame are decoded and on_action_frame
+          is passed a dict holding them and turnInfo, whatever decoded_messages is. If empty, action frames are
+          skipped without being decoded. If None, the default, action frames are decoded in full.
 
     """
     def __init__(self):
         self.config = None
+        self.decoded_messages = False
+        self.frame_keys = None
 
     def on_game_start(self, config):
         """
@@ -26,7 +34,8 @@ class AlgoCore(object):
     def on_turn(self, game_state):
         """
         This step function is called at the start of each turn.
-        It is passed the current game state, which can be used to initiate a new GameState object. 
+        It is passed the current game state, which can be used to initiate a new GameState object.
+        The game state is a json string, or a dict if decoded_messages is set. 
         By default, it sends empty commands to the game engine. \n
         algo_strategy.py inherits from AlgoCore and overrides this on turn function. 
         Adjusting the on_turn function in algo_strategy is the main way to adjust your algo's logic. 
@@ -40,6 +49,7 @@ class AlgoCore(object):
         The action phase is made up of a sequence of distinct frames. 
         Each of these frames is sent to the algo in order. 
         They can be handled in this function. 
+        The frame is a json string, or a dict if decoded_messages or frame_keys is set.
         """
         pass
 
@@ -61,22 +71,34 @@ class AlgoCore(object):
                 """
                 This means this must be the config file. So, load in the config file as a json and add it to your AlgoStrategy class.
                 """
-                parsed_config = json.loads(game_state_string)
+                parsed_config = codec.loads(game_state_string)
                 self.on_game_start(parsed_config)
             elif "turnInfo" in game_state_string:
-                state = json.loads(game_state_string)
+                if self.frame_keys is not None:
+                    turn_info = decode_keys(game_state_string, ["turnInfo"])["turnInfo"]
+                    if int(turn_info[0]) == 1:
+                        """
+                        This is an action frame and the algo subscribed to some of its keys, so only decode those.
+                        """
+                        if self.frame_keys:
+                            frame = decode_keys(game_state_string, self.frame_keys)
+                            frame["turnInfo"] = turn_info
+                            self.on_action_frame(frame)
+                        continue
+                state = codec.loads(game_state_string)
                 stateType = int(state.get("turnInfo")[0])
+                message = state if self.decoded_messages else game_state_string
                 if stateType == 0:
                     """
                     This is the game turn game state message. Algo must now print to stdout 2 lines, one for build phase one for
                     deploy phase. Printing is handled by the provided functions.
                     """
-                    self.on_turn(game_state_string)
+                    self.on_turn(message)
                 elif stateType == 1:
                     """
                     If stateType == 1, this game_state_string string represents a single frame of an action phase
                     """
-                    self.on_action_frame(game_state_string)
+                    self.on_action_frame(message)
                 elif stateType == 2:
                     """
                     This is the end game message. This means the game is over so break and finish the program.
@@ -0,0 +1,96 @@
+"""
+Decodes and encodes the json messages exchanged with the game engine.
+
+The fastest json library installed is used, trying orjson, then ujson, then the json module of the standard library.
+BACKEND holds the name of the library picked, and loads and dumps are its functions to decode a json string
+and to encode an object as a json string. The libraries differ only in formatting, for example orjson
+does not put spaces after separators, which the game engine does not care about.
+
+Run this module (python -m gamelib.codec) to time every installed library on a typical action frame.
+"""
+import json
+import random
+import timeit
+
+def _json_backend():
+    return json.loads, json.dumps
+
+def _orjson_backend():
+    import orjson
+    return orjson.loads, lambda obj: orjson.dumps(obj).decode("utf-8")
+
+def _ujson_backend():
+    import ujson
+    return ujson.loads, ujson.dumps
+
+BACKENDS = {}
+for _name, _backend in [("orjson", _orjson_backend), ("ujson", _ujson_backend), ("json", _json_backend)]:
+    try:
+        BACKENDS[_name] = _backend()
+    except ImportError:
+        pass
+
+BACKEND = next(iter(BACKENDS))
+loads, dumps = BACKENDS[BACKEND]
+
+def make_frame(seed=0, units_per_type=30):
+    """Builds an action frame shaped like those sent by the game engine, with random units and events
+
+    Args:
+        seed: The seed of the random generator
+        units_per_type: How many units of each type both players have
+
+    Returns:
+        The frame as a json string
+
+    """
+    rng = random.Random(seed)
+
+    def units(player_index):
+        y_range = range(0, 14) if player_index == 0 else range(14, 28)
+        return [[[rng.randrange(28), rng.choice(y_range), float(rng.randrange(1, 76)), str(rng.randrange(10000))]
+                 for _ in range(units_per_type)] for _ in range(8)]
+
+    def location():
+        return [rng.randrange(28), rng.randrange(28)]
+
+    events = {
+        "selfDestruct": [],
+        "breach": [[location(), 1.0, 3, str(rng.randrange(10000)), 2]],
+        "damage": [[location(), 2.0, rng.randrange(6), str(rng.randrange(10000)), 1] for _ in range(20)],
+        "shield": [],
+        "move": [[location(), location(), [0, 0], 3, str(rng.randrange(10000)), 1] for _ in range(40)],
+        "spawn": [],
+        "death": [[location(), 3, str(rng.randrange(10000)), 2, False] for _ in range(5)],
+        "attack": [[location(), location(), 2.0, 3, str(rng.randrange(10000)), str(rng.randrange(10000)), 1] for _ in range(20)],
+        "melee": []}
+    frame = {
+        "p2Units": units(1),
+        "turnInfo": [1, 12, 40],
+        "p1Stats": [24.0, 12.5, 8.3, 1402],
+        "p1Units": units(0),
+        "p2Stats": [19.0, 4.0, 11.7, 2211],
+        "events": events}
+    return json.dumps(frame)
+
+def benchmark(message=None, number=1000):
+    """Times decoding a message with every installed library
+
+    Args:
+        message: The json string to decode, a frame built by make_frame by default
+        number: How many times to decode it
+
+    Returns:
+        A dict mapping the name of each installed library to its decode time per message, in seconds
+
+    """
+    if message is None:
+        message = make_frame()
+    return {name: timeit.timeit(lambda: backend_loads(message), number=number) / number
+            for name, (backend_loads, _) in BACKENDS.items()}
+
+if __name__ == "__main__":
+    frame = make_frame()
+    print("Decoding a {} byte action frame, using {}".format(len(frame), BACKEND))
+    for name, seconds in benchmark(frame).items():
+        print("{:>8}: {:8.1f} us per message".format(name, seconds * 1e6))
@@ -1,7 +1,167 @@
+import copy
 import math
+import random
 from .unit import GameUnit
 from .util import debug_write
 
+"""
+Flat tile tables for the diamond arena. Each on-board location is given a compact
+integer id (0 to 419), assigned row by row from the bottom of the board, so that
+hot loops such as pathfinding can work on flat arrays instead of [x, y] lists.
+"""
+_ARENA_SIZE = 28
+_HALF_ARENA = _ARENA_SIZE // 2
+
+def _row_start(y):
+    """The x coordinate of the leftmost on-board tile of row y"""
+    row_size = y + 1 if y < _HALF_ARENA else _ARENA_SIZE - y
+    return _HALF_ARENA - row_size
+
+_TILE_X = []
+_TILE_Y = []
+_TILE_ID = [[-1] * _ARENA_SIZE for _ in range(_ARENA_SIZE)]
+for _y in range(_ARENA_SIZE):
+    for _x in range(_row_start(_y), _ARENA_SIZE - _row_start(_y)):
+        _TILE_ID[_x][_y] = len(_TILE_X)
+        _TILE_X.append(_x)
+        _TILE_Y.append(_y)
+_TILE_X = tuple(_TILE_X)
+_TILE_Y = tuple(_TILE_Y)
+_TILE_COUNT = len(_TILE_X)
+_LOCATIONS = tuple([_TILE_X[_tile], _TILE_Y[_tile]] for _tile in range(_TILE_COUNT))
+_ON_BOARD = frozenset(zip(_TILE_X, _TILE_Y))
+
+_ROW_BITS = [0] * _ARENA_SIZE
+_COLUMN_BITS = [0] * _ARENA_SIZE
+for _tile in range(_TILE_COUNT):
+    _ROW_BITS[_TILE_Y[_tile]] |= 1 << _tile
+    _COLUMN_BITS[_TILE_X[_tile]] |= 1 << _tile
+
+_BINARY_DIGITS = bytes.maketrans(b"01", b"\x00\x01")
+
+def _bits_to_bytes(bits):
+    """Expands a bitboard into one byte per tile id, 1 where the bit is set"""
+    return format(bits, "0{}b".format(_TILE_COUNT))[::-1].encode().translate(_BINARY_DIGITS)
+
+_MIRROR_TILE = tuple(_TILE_ID[_ARENA_SIZE - 1 - _TILE_X[_tile]][_TILE_Y[_tile]] for _tile in range(_TILE_COUNT))
+
+def _mirror_bits(bits):
+    """Reflects a bitboard across the vertical center line of the arena"""
+    mirrored = 0
+    while bits:
+        lowest_bit = bits & -bits
+        bits ^= lowest_bit
+        mirrored |= 1 << _MIRROR_TILE[lowest_bit.bit_length() - 1]
+    return mirrored
+
+_RANGE_TILES = {}
+_RANGE_BITS = {}
+
+def _tiles_in_range(tile, radius, inclusive=True):
+    """The ids of the tiles whose centers are within radius of a tile, in ascending order.
+    Tiles at exactly radius count only if inclusive, as in get_attackers. get_locations_in_range excludes them.
+    """
+    key = (tile, radius, inclusive)
+    tiles = _RANGE_TILES.get(key)
+    if tiles is None:
+        x, y = _TILE_X[tile], _TILE_Y[tile]
+        reach = int(radius)
+        tiles = []
+        for j in range(max(0, y - reach), min(_ARENA_SIZE, y + reach + 1)):
+            for i in range(max(0, x - reach), min(_ARENA_SIZE, x + reach + 1)):
+                distance = math.sqrt((x - i)**2 + (y - j)**2)
+                if _TILE_ID[i][j] >= 0 and (distance <= radius if inclusive else distance < radius):
+                    tiles.append(_TILE_ID[i][j])
+        tiles = tuple(tiles)
+        _RANGE_TILES[key] = tiles
+    return tiles
+
+def _range_bits(tile, radius, inclusive=True):
+    """A bitboard of _tiles_in_range"""
+    key = (tile, radius, inclusive)
+    bits = _RANGE_BITS.get(key)
+    if bits is None:
+        bits = 0
+        for target in _tiles_in_range(tile, radius, inclusive):
+            bits |= 1 << target
+        _RANGE_BITS[key] = bits
+    return bits
+
+_STENCILS = {}
+_STENCIL_TILES = {}
+
+def _range_stencil(radius, hit_radius):
+    """The (dx, dy) offsets of the locations get_locations_in_range finds around a location, in the order it finds them"""
+    key = (radius, hit_radius)
+    stencil = _STENCILS.get(key)
+    if stencil is None:
+        search_radius = math.ceil(radius)
+        stencil = tuple((dx, dy) for dx in range(-search_radius, search_radius + 1) for dy in range(-search_radius, search_radius + 1)
+                        if math.sqrt(dx**2 + dy**2) < radius + hit_radius)
+        _STENCILS[key] = stencil
+    return stencil
+
+def _stencil_tiles(x, y, radius, hit_radius):
+    """The ids of the on-board tiles of the range stencil centered on [x, y], clipped once and memoised for on-board centers"""
+    key = (x, y, radius, hit_radius)
+    tiles = _STENCIL_TILES.get(key)
+    if tiles is None:
+        tiles = []
+        for dx, dy in _range_stencil(radius, hit_radius):
+            i, j = x + dx, y + dy
+            if 0 <= i < _ARENA_SIZE and 0 <= j < _ARENA_SIZE and _TILE_ID[i][j] >= 0:
+                tiles.append(_TILE_ID[i][j])
+        tiles = tuple(tiles)
+        if 0 <= x < _ARENA_SIZE and 0 <= y < _ARENA_SIZE and _TILE_ID[x][y] >= 0:
+            _STENCIL_TILES[key] = tiles
+    return tiles
+
+_ZOBRIST_KEYS = {}
+_HASH_MASK = (1 << 64) - 1
+
+def _zobrist_key(tile, unit_type, player_index, upgraded):
+    """The random 64 bit number standing for one unit of a type, owner and upgrade level at a tile.
+    Each key is seeded from its description, so keys are the same in every process.
+    """
+    description = (tile, unit_type, player_index, upgraded)
+    key = _ZOBRIST_KEYS.get(description)
+    if key is None:
+        key = random.Random("{}:{}:{}:{}".format(*description)).getrandbits(64)
+        _ZOBRIST_KEYS[description] = key
+    return key
+
+def _values_to_grid(values):
+    """Lays out a list of values indexed by tile id as an ARENA_SIZE by ARENA_SIZE grid indexed as grid[x][y], 0 off the board"""
+    grid = [[0] * _ARENA_SIZE for _ in range(_ARENA_SIZE)]
+    for tile, value in enumerate(values):
+        grid[_TILE_X[tile]][_TILE_Y[tile]] = value
+    return grid
+
+# Edge tile ids, in the order of GameMap.get_edges: top right, top left, bottom left, bottom right
+_EDGE_TILES = (
+    tuple(_TILE_ID[_HALF_ARENA + n][_ARENA_SIZE - 1 - n] for n in range(_HALF_ARENA)),
+    tuple(_TILE_ID[_HALF_ARENA - 1 - n][_ARENA_SIZE - 1 - n] for n in range(_HALF_ARENA)),
+    tuple(_TILE_ID[_HALF_ARENA - 1 - n][n] for n in range(_HALF_ARENA)),
+    tuple(_TILE_ID[_HALF_ARENA + n][n] for n in range(_HALF_ARENA)))
+_TILE_EDGE = [-1] * _TILE_COUNT
+for _edge, _edge_tiles in enumerate(_EDGE_TILES):
+    for _tile in _edge_tiles:
+        _TILE_EDGE[_tile] = _edge
+_TILE_EDGE = tuple(_TILE_EDGE)
+
+def _tile_id(location):
+    """The tile id of a location, or -1 if it is off the board or between tiles. Tile ids are passed through."""
+    if type(location) == int:
+        return location if 0 <= location < _TILE_COUNT else -1
+    x, y = location
+    if type(x) != int or type(y) != int:
+        if x != int(x) or y != int(y):
+            return -1
+        x, y = int(x), int(y)
+    if 0 <= x < _ARENA_SIZE and 0 <= y < _ARENA_SIZE:
+        return _TILE_ID[x][y]
+    return -1
+
 class GameMap:
     """Holds data about the current game map and provides functions
     useful for getting information related to the map.
@@ -9,6 +169,18 @@ class GameMap:
     game_map[x, y] will return a list of Units located at that location, 
     or an empty list if there are no units at the location
 
+    The map also keeps bitboards of the tiles holding structures, per player and structure type.
+    Bit n of a bitboard stands for the nth location yielded when iterating over the map.
+    They are kept up to date by add_unit, remove_unit, upgrade, game_map[x, y] = units and turn parsing,
+    so units should not be added to, removed from or upgraded in the lists returned by game_map[x, y] directly.
+    The same goes for the threat and shield maps, see get_threat and get_shield, which are built on first use
+    and then updated as units come and go.
+
+    A map made by fork shares its tiles with the map it was forked from. A tile, and the units on it, are only
+    copied when one of the maps changes it through the functions above, so a fork costs about as much as the
+    tiles it ends up changing. Transactions, see GameState.transaction, work the same way: the first change to a tile
+    in a transaction keeps the tile's old units aside, and rolling back puts them back.
+
     Attributes :
         * config (JSON): Contains information about the current game rules
         * enable_warnings (bool): If true, debug messages for game_map functions will print out
@@ -18,6 +190,7 @@ class GameMap:
         * TOP_LEFT (int): A constant that represents the top left edge
         * BOTTOM_LEFT (int): Hidden challenge! Can you guess what this constant represents???
         * BOTTOM_RIGHT (int): A constant that represents the bottom right edge
+        * TILE_COUNT (int): The number of locations on the board. Each has a tile id from 0 to TILE_COUNT - 1, see get_tile_id.
 
     """
     def __init__(self, config):
@@ -35,8 +208,27 @@ class GameMap:
         self.TOP_LEFT = 1
         self.BOTTOM_LEFT = 2
         self.BOTTOM_RIGHT = 3
+        self.TILE_COUNT = _TILE_COUNT
         self.__map = self.__empty_grid()
-        self.__start = [13,0]
+        self.__edges = self.__build_edges()
+        self.__structure_bits = {}
+        self.__mobile_bits = {}
+        self.__upgraded_bits = 0
+        self.__blocked_bits = 0
+        self.__layout_keys = {}
+        self.__threat = None
+        self.__shield = None
+        self.__shared = False
+        self.__owned_columns = set()
+        self.__owned_tiles = set()
+        self.__transactions = []
+        self.__hash = 0
+        self.__hit_radius = config["unitInformation"][0].get('getHitRadius', 0)
+        for unit_info in config["unitInformation"]:
+            for stats in [unit_info, unit_info.get("upgrade", {})]:
+                for range_name in ["attackRange", "shieldRange", "selfDestructRange"]:
+                    if range_name in stats:
+                        _range_stencil(stats[range_name], self.__hit_radius)
     
     def __getitem__(self, location):
         if len(location) == 2 and self.in_arena_bounds(location):
@@ -46,26 +238,21 @@ class GameMap:
 
     def __setitem__(self, location, val):
         if type(location) == tuple and len(location) == 2 and self.in_arena_bounds(location):
-            self.__map[location[0]][location[1]] = val
+            x, y = location
+            for unit in self.__map[x][y]:
+                self.__unindex_unit(unit, x, y)
+            self.__replace_tile(x, y, val)
+            for unit in val:
+                self.__index_unit(unit, x, y)
             return
         self._invalid_coordinates(location)
 
     def __iter__(self):
-        self.__start = [13,0]
-        return self
-    
-    def __next__(self):
-        location = self.__start
-        if location == [15,27]:
-            raise StopIteration
-        new_location = [location[0]+1, location[1]]
-        while not self.in_arena_bounds(new_location) and not location == [14,27]:
-            if new_location[0] == self.ARENA_SIZE:
-                new_location = [0, new_location[1]+1]
-            else:
-                new_location = [new_location[0]+1, new_location[1]]
-        self.__start = new_location
-        return location 
+        """Iterates over every location on the board, row by row from the bottom.
+        Each loop gets its own iterator, so loops over the same map can be nested.
+        The locations come from a table shared by every map, so copy them before modifying them.
+        """
+        return iter(_LOCATIONS)
 
     def __empty_grid(self):
         grid = []
@@ -89,6 +276,30 @@ class GameMap:
         
         """
         x, y = location
+        if (x, y) in _ON_BOARD:
+            return True
+        if x % 1 == 0 and y % 1 == 0:
+            # Whole number coordinates are all in the table, so this one is off the board
+            return False
+        return self.__in_bounds_by_rows(x, y)
+
+    def in_arena_bounds_many(self, xs, ys):
+        """Checks many locations at once, see in_arena_bounds
+
+        Args:
+            xs: The x coordinates of the locations
+            ys: The y coordinates of the locations, in the same order
+
+        Returns:
+            A list with True for each location on the board, False otherwise
+
+        """
+        on_board = _ON_BOARD
+        in_bounds_by_rows = self.__in_bounds_by_rows
+        return [(x, y) in on_board or (not (x % 1 == 0 and y % 1 == 0) and in_bounds_by_rows(x, y)) for x, y in zip(xs, ys)]
+
+    def __in_bounds_by_rows(self, x, y):
+        """Checks the bounds of any location, including fractional ones, from the width of its row"""
         half_board = self.HALF_ARENA
 
         row_size = y + 1
@@ -103,6 +314,49 @@ class GameMap:
 
         return bottom_half_check or top_half_check
 
+    def get_tile_id(self, location):
+        """Gets the compact integer id of a location.
+        Ids run from 0 to TILE_COUNT - 1 in the order the map iterates over locations, and are the bit positions of the bitboards.
+        Many functions accept a tile id wherever they take a location, and some can return tile ids instead of [x, y] lists,
+        which saves allocating lists and lets hot loops index flat lists instead.
+
+        Args:
+            location: A map location
+
+        Returns:
+            The tile id of the location, or -1 if it is not on the board or not a whole tile such as [13.5, 6],
+            so this doubles as a bounds check
+
+        """
+        return _tile_id(location)
+
+    def get_tile_location(self, tile_id):
+        """Gets the location of a tile id, see get_tile_id
+
+        Args:
+            tile_id: A tile id
+
+        Returns:
+            The [x, y] location of the tile
+
+        """
+        return [_TILE_X[tile_id], _TILE_Y[tile_id]]
+
+    def get_edge_tile_ids(self, quadrant_description):
+        """Like get_edge_locations, but returns the tile ids of the edge locations, see get_tile_id
+
+        Args:
+            quadrant_description: A constant corresponding to one of the 4 edges. See game_map.TOP_LEFT, game_map.BOTTOM_RIGHT, and similar constants.
+
+        Returns:
+            A tuple with the tile ids of the edge locations, in the same order as get_edge_locations
+
+        """
+        if not quadrant_description in [self.TOP_LEFT, self.TOP_RIGHT, self.BOTTOM_LEFT, self.BOTTOM_RIGHT]:
+            self.warn("Passed invalid quadrant_description '{}'. See the documentation for valid inputs for get_edge_tile_ids.".format(quadrant_description))
+            return
+        return _EDGE_TILES[quadrant_description]
+
     def get_edge_locations(self, quadrant_description):
         """Takes in an edge description and returns a list of locations.
         
@@ -110,15 +364,14 @@ class GameMap:
             quadrant_description: A constant corresponding to one of the 4 edges. See game_map.TOP_LEFT, game_map.BOTTOM_RIGHT, and similar constants.
 
         Returns:
-            A list of locations along the requested edge
+            A list of locations along the requested edge, as new [x, y] lists that can be modified freely
 
         """
         if not quadrant_description in [self.TOP_LEFT, self.TOP_RIGHT, self.BOTTOM_LEFT, self.BOTTOM_RIGHT]:
             self.warn("Passed invalid quadrant_description '{}'. See the documentation for valid inputs for get_edge_locations.".format(quadrant_description))
             return
 
-        edges = self.get_edges()
-        return edges[quadrant_description]
+        return [list(location) for location in self.__edges[quadrant_description]]
 
     def get_edges(self):
         """Gets all of the edges and their edge locations
@@ -126,7 +379,29 @@ class GameMap:
         Returns:
             A list with four lists inside of it of locations corresponding to the four edges.
             [0] = top_right, [1] = top_left, [2] = bottom_left, [3] = bottom_right.
+
+        The edges are computed once per map. Each call returns new lists of new [x, y] locations.
+        """
+        return [[list(location) for location in edge] for edge in self.__edges]
+
+    def is_on_edge(self, location, quadrant_description=None):
+        """Checks if a location is on an edge with a single table lookup
+
+        Args:
+            location: A map location or a tile id
+            quadrant_description: The edge to check, see game_map.TOP_LEFT and similar constants. Any edge if None.
+
+        Returns:
+            True if the location is on the edge, False otherwise
+
         """
+        tile = _tile_id(location)
+        if tile < 0:
+            return False
+        edge = _TILE_EDGE[tile]
+        return edge >= 0 if quadrant_description is None else edge == quadrant_description
+
+    def __build_edges(self):
         top_right = []
         for num in range(0, self.HALF_ARENA):
             x = self.HALF_ARENA + num
@@ -147,7 +422,7 @@ class GameMap:
             x = self.HALF_ARENA + num
             y = num
             bottom_right.append([int(x), int(y)])
-        return [top_right, top_left, bottom_left, bottom_right]
+        return (tuple(top_right), tuple(top_left), tuple(bottom_left), tuple(bottom_right))
     
     def add_unit(self, unit_type, location, player_index=0):
         """Add a single GameUnit to the map at the given location.
@@ -169,9 +444,32 @@ class GameMap:
         x, y = location
         new_unit = GameUnit(unit_type, self.config, player_index, None, location[0], location[1])
         if not new_unit.stationary:
-            self.__map[x][y].append(new_unit)
+            self.__own_tile(x, y).append(new_unit)
+            self.__index_unit(new_unit, x, y)
         else:
-            self.__map[x][y] = [new_unit]
+            for unit in self.__map[x][y]:
+                self.__unindex_unit(unit, x, y)
+            self.__replace_tile(x, y, [new_unit])
+            self.__index_unit(new_unit, x, y)
+
+    def _place_unit(self, unit):
+        """Adds an existing GameUnit to the map at its own location, on top of any units already there.
+        Used internally by GameState when parsing the game state.
+        """
+        self.__own_tile(unit.x, unit.y).append(unit)
+        self.__index_unit(unit, unit.x, unit.y)
+
+    def _take_unit(self, unit):
+        """Takes a single GameUnit off the map, leaving any other units at its location in place.
+        Used internally by the action phase simulator.
+        """
+        index = [id(other) for other in self.__map[unit.x][unit.y]].index(id(unit))
+        units = self.__own_tile(unit.x, unit.y)
+        del units[index]
+        self.__unindex_unit(unit, unit.x, unit.y)
+        for other in units:
+            # Only the bitboard bits are restored, the hash, threat and shield of the remaining units were never taken away
+            self.__index_unit(other, unit.x, unit.y, update_fields=False)
 
     def remove_unit(self, location):
         """Remove all units on the map in the given location.
@@ -186,34 +484,533 @@ class GameMap:
             self._invalid_coordinates(location)
         
         x, y = location
-        self.__map[x][y] = []
+        for unit in self.__map[x][y]:
+            self.__unindex_unit(unit, x, y)
+        self.__replace_tile(x, y, [])
+
+    def upgrade(self, location):
+        """Upgrade the structure at the given location.
+
+        Args:
+            location: The location of the structure to upgrade
+
+        Returns:
+            The upgraded unit, or None if there is no structure at the location
 
-    def get_locations_in_range(self, location, radius):
+        Like add_unit, this function only changes the data stored in GameMap. Use GameState.attempt_upgrade to upgrade
+        units during your turn.
+        """
+        if not self.in_arena_bounds(location):
+            self._invalid_coordinates(location)
+            return
+
+        x, y = location
+        for unit in self.__own_tile(x, y):
+            if unit.stationary:
+                self.__unindex_unit(unit, x, y)
+                unit.upgrade()
+                self.__index_unit(unit, x, y)
+                return unit
+
+    def fork(self):
+        """Makes a copy of the map that can be changed without changing this one.
+        Both maps share their tiles until one of them changes a tile, which is then copied for that map only.
+
+        Returns:
+            A new GameMap
+
+        """
+        child = copy.copy(self)
+        child.__map = list(self.__map)
+        child.__structure_bits = dict(self.__structure_bits)
+        child.__mobile_bits = dict(self.__mobile_bits)
+        child.__layout_keys = dict(self.__layout_keys)
+        if self.__threat is not None:
+            child.__threat = [tuple(list(values) for values in fields) for fields in self.__threat]
+        if self.__shield is not None:
+            child.__shield = [tuple(list(values) for values in fields) for fields in self.__shield]
+        for game_map in [self, child]:
+            game_map.__shared = True
+            game_map.__owned_columns = set()
+            game_map.__owned_tiles = set()
+        child.__transactions = []
+        return child
+
+    def _begin_transaction(self):
+        """Starts recording changes so they can be undone by _rollback_transaction. Transactions can be nested.
+        Used internally by GameState.transaction.
+        """
+        self.__transactions.append({})
+
+    def _rollback_transaction(self):
+        """Undoes every change made since the matching _begin_transaction, in time proportional to the number of tiles changed.
+        Used internally by GameState.transaction.
+        """
+        saved = self.__transactions.pop()
+        for (x, y), (units, owned) in saved.items():
+            for unit in self.__map[x][y]:
+                self.__unindex_unit(unit, x, y)
+            self.__own_column(x)
+            self.__map[x][y] = units
+            if not owned:
+                self.__owned_tiles.discard((x, y))
+            for unit in units:
+                self.__index_unit(unit, x, y)
+
+    def __save_tile(self, x, y):
+        """Keeps the units at [x, y] aside the first time the tile changes in the innermost transaction. Returns True if it did."""
+        if not self.__transactions or (x, y) in self.__transactions[-1]:
+            return False
+        self.__transactions[-1][x, y] = (self.__map[x][y], (x, y) in self.__owned_tiles)
+        return True
+
+    def __own_column(self, x):
+        """Makes sure column x of the grid is not shared with another map before it is changed"""
+        if self.__shared and x not in self.__owned_columns:
+            self.__map[x] = list(self.__map[x])
+            self.__owned_columns.add(x)
+
+    def __own_tile(self, x, y):
+        """Makes sure the units at [x, y] are not shared with another map before they are changed, and returns them"""
+        if self.__save_tile(x, y) or (self.__shared and (x, y) not in self.__owned_tiles):
+            self.__own_column(x)
+            self.__map[x][y] = [copy.copy(unit) for unit in self.__map[x][y]]
+            if self.__shared:
+                self.__owned_tiles.add((x, y))
+        return self.__map[x][y]
+
+    def __replace_tile(self, x, y, units):
+        """Puts a new list of units at [x, y]"""
+        self.__save_tile(x, y)
+        self.__own_column(x)
+        self.__map[x][y] = units
+        if self.__shared:
+            self.__owned_tiles.add((x, y))
+
+    def __index_unit(self, unit, x, y, update_fields=True):
+        """Records a unit that was put on the map in the hash, the bitboards and the threat and shield maps"""
+        tile = _tile_id([x, y])
+        if tile < 0:
+            return
+        if update_fields:
+            self.__hash = (self.__hash + _zobrist_key(tile, unit.unit_type, unit.player_index, unit.upgraded)) & _HASH_MASK
+        if update_fields and unit.stationary:
+            if self.__threat is not None:
+                self.__add_threat(unit, tile, 1)
+            if self.__shield is not None:
+                self.__add_shield(unit, tile, 1)
+        type_bits = self.__structure_bits if unit.stationary else self.__mobile_bits
+        key = (unit.player_index, unit.unit_type)
+        type_bits[key] = type_bits.get(key, 0) | (1 << tile)
+        if unit.upgraded:
+            self.__upgraded_bits |= 1 << tile
+        self.__blocked_bits = None
+        self.__layout_keys = {}
+
+    def __unindex_unit(self, unit, x, y):
+        """Records a unit that was taken off the map in the hash, the bitboards and the threat and shield maps"""
+        tile = _tile_id([x, y])
+        if tile < 0:
+            return
+        self.__hash = (self.__hash - _zobrist_key(tile, unit.unit_type, unit.player_index, unit.upgraded)) & _HASH_MASK
+        if unit.stationary:
+            if self.__threat is not None:
+                self.__add_threat(unit, tile, -1)
+            if self.__shield is not None:
+                self.__add_shield(unit, tile, -1)
+        type_bits = self.__structure_bits if unit.stationary else self.__mobile_bits
+        key = (unit.player_index, unit.unit_type)
+        type_bits[key] = type_bits.get(key, 0) & ~(1 << tile)
+        if unit.upgraded:
+            self.__upgraded_bits &= ~(1 << tile)
+        self.__blocked_bits = None
+        self.__layout_keys = {}
+
+    def __add_threat(self, unit, tile, sign):
+        """Adds the threat of a structure at a tile to the threat map, or takes it away if sign is -1"""
+        if unit.damage_i + unit.damage_f <= 0 or unit.player_index not in [0, 1]:
+            return
+        attackers, damage_i, damage_f = self.__threat[1 - unit.player_index]
+        unit_damage_i = sign * unit.damage_i
+        unit_damage_f = sign * unit.damage_f
+        for target in _tiles_in_range(tile, unit.attackRange):
+            attackers[target] += sign
+            damage_i[target] += unit_damage_i
+            damage_f[target] += unit_damage_f
+
+    def __get_threat(self):
+        """The threat map, built from the structures on the map the first time it is needed"""
+        if self.__threat is None:
+            self.__threat = [tuple([0] * _TILE_COUNT for _ in range(3)) for _ in range(2)]
+            for location in self.get_locations_from_bits(self.get_structure_bits()):
+                x, y = location
+                for unit in self.__map[x][y]:
+                    if unit.stationary:
+                        self.__add_threat(unit, _TILE_ID[x][y], 1)
+        return self.__threat
+
+    def get_threat(self, location, player_index):
+        """Gets the threat structures pose to a unit of the given player at a location
+
+        Args:
+            location: A map location or a tile id
+            player_index: The index corresponding to the defending player, 0 for you 1 for the enemy
+
+        Returns:
+            A tuple with the number of enemy structures that can attack the location, their summed damage
+            to a mobile unit (damage_i) and their summed damage to a structure (damage_f). (0, 0, 0) if the location is off the board.
+
+        The counts match the stationary units returned by GameState.get_attackers, but are read from a threat map
+        that is built once and then updated whenever structures are added, removed or upgraded.
+        """
+        tile = _tile_id(location)
+        if tile < 0:
+            return 0, 0, 0
+        attackers, damage_i, damage_f = self.__get_threat()[player_index]
+        return attackers[tile], damage_i[tile], damage_f[tile]
+
+    def get_threat_map(self, player_index):
+        """Gets the threat structures pose to a unit of the given player on every tile
+
+        Args:
+            player_index: The index corresponding to the defending player, 0 for you 1 for the enemy
+
+        Returns:
+            A dict with the keys "attackers", "damage_i" and "damage_f", each holding an ARENA_SIZE by ARENA_SIZE grid
+            indexed as grid[x][y], see get_threat. Off board entries are 0.
+
+        """
+        return dict(zip(["attackers", "damage_i", "damage_f"], map(_values_to_grid, self.__get_threat()[player_index])))
+
+    def get_path_damage(self, path, player_index):
+        """Sums the damage per frame a mobile unit of the given player takes from structures along a path
+
+        Args:
+            path: A list of locations or tile ids, as returned by GameState.find_path_to_edge
+            player_index: The index corresponding to the defending player, 0 for you 1 for the enemy
+
+        Returns:
+            The sum of the damage_i of get_threat over the locations of the path
+
+        """
+        damage_i = self.__get_threat()[player_index][1]
+        damage = 0
+        for location in path:
+            tile = _tile_id(location)
+            if tile >= 0:
+                damage += damage_i[tile]
+        return damage
+
+    def __add_shield(self, unit, tile, sign):
+        """Adds the shield a structure at a tile gives to the shield map, or takes it away if sign is -1"""
+        if unit.shieldPerUnit <= 0 or unit.shieldRange <= 0 or unit.player_index not in [0, 1]:
+            return
+        shield, supporters = self.__shield[unit.player_index]
+        unit_shield = sign * unit.shieldPerUnit
+        supporter_bit = 1 << tile
+        # Shields reach tiles whose centers are within shieldRange plus the hit radius, as in get_locations_in_range
+        reach = unit.shieldRange + self.__hit_radius
+        for target in _tiles_in_range(tile, reach, inclusive=False):
+            shield[target] += unit_shield
+            supporters[target] ^= supporter_bit
+
+    def __get_shield(self):
+        """The shield map, built from the structures on the map the first time it is needed"""
+        if self.__shield is None:
+            self.__shield = [([0] * _TILE_COUNT, [0] * _TILE_COUNT) for _ in range(2)]
+            for location in self.get_locations_from_bits(self.get_structure_bits()):
+                x, y = location
+                for unit in self.__map[x][y]:
+                    if unit.stationary:
+                        self.__add_shield(unit, _TILE_ID[x][y], 1)
+        return self.__shield
+
+    def get_shield(self, location, player_index):
+        """Gets the shield structures give to a mobile unit of the given player at a location
+
+        Args:
+            location: A map location or a tile id
+            player_index: The index corresponding to the player owning the mobile unit, 0 for you 1 for the enemy
+
+        Returns:
+            The summed shieldPerUnit of the friendly structures whose shield range covers the location, 0 if it is off the board
+
+        Like the threat map, the shield map is built once and then updated whenever structures are added, removed or upgraded.
+        """
+        tile = _tile_id(location)
+        if tile < 0:
+            return 0
+        return self.__get_shield()[player_index][0][tile]
+
+    def get_shield_map(self, player_index):
+        """Gets the shield structures give to a mobile unit of the given player on every tile
+
+        Args:
+            player_index: The index corresponding to the player owning the mobile units, 0 for you 1 for the enemy
+
+        Returns:
+            An ARENA_SIZE by ARENA_SIZE grid indexed as grid[x][y], see get_shield. Off board entries are 0.
+
+        """
+        return _values_to_grid(self.__get_shield()[player_index][0])
+
+    def get_path_shield(self, path, player_index):
+        """Gets the total shield a mobile unit of the given player picks up walking along a path
+
+        Args:
+            path: A list of locations or tile ids, as returned by GameState.find_path_to_edge
+            player_index: The index corresponding to the player owning the mobile unit, 0 for you 1 for the enemy
+
+        Returns:
+            The summed shieldPerUnit of every friendly structure whose shield range covers at least one location of the path.
+            Each structure shields a unit only once, however many of the path's locations it covers.
+
+        """
+        supporters = self.__get_shield()[player_index][1]
+        path_supporters = 0
+        for location in path:
+            tile = _tile_id(location)
+            if tile >= 0:
+                path_supporters |= supporters[tile]
+
+        shield = 0
+        for x, y in self.get_locations_from_bits(path_supporters):
+            for unit in self.__map[x][y]:
+                if unit.stationary:
+                    shield += unit.shieldPerUnit
+        return shield
+
+    def get_hash(self):
+        """Gets a 64 bit hash of which units are on which tiles, by type, owner and upgrade level. Health is not included.
+        It is kept up to date in constant time per change by add_unit, remove_unit, upgrade and turn parsing,
+        so it is a cheap key for caches of paths, threat maps or simulation results.
+
+        The hash is the sum, modulo 2**64, of a random key per unit, so stacked identical mobile units do not cancel out
+        as they would with xor. Equal boards always have equal hashes, and different boards almost never do.
+        For an exact key, see get_layout_key.
+
+        Returns:
+            An int between 0 and 2**64 - 1
+
+        """
+        return self.__hash
+
+    def get_layout_key(self, mirrored=False):
+        """Gets a hashable description of which unit types, owners and upgrades are on which tiles.
+        Two maps with the same layout key give the same answers to path and threat queries.
+
+        Args:
+            mirrored: If True, describe the layout reflected across the vertical center line of the arena instead.
+                A layout is mirror symmetric when both keys are equal.
+
+        Returns:
+            A tuple of bitboards, see get_structure_bits
+
+        """
+        key = self.__layout_keys.get(mirrored)
+        if key is None:
+            reflect = _mirror_bits if mirrored else int
+            entries = []
+            for type_bits in [self.__structure_bits, self.__mobile_bits]:
+                for (owner, unit_type), bits in type_bits.items():
+                    if bits:
+                        entries.append((str(owner), unit_type, reflect(bits)))
+            key = (tuple(sorted(entries)), reflect(self.__upgraded_bits))
+            self.__layout_keys[mirrored] = key
+        return key
+
+    def get_structure_bits(self, player_index=None, unit_type=None):
+        """Gets a bitboard of the tiles holding structures
+
+        Args:
+            player_index: Only count structures of this player, 0 for you 1 for the enemy. All players if None.
+            unit_type: Only count structures of this type. All structure types if None.
+
+        Returns:
+            An int where bit n is set if the nth location of the map holds a matching structure.
+            Comparing, hashing or combining boards is a single integer operation.
+
+        """
+        bits = 0
+        if player_index is None and unit_type is None and self.__blocked_bits is not None:
+            return self.__blocked_bits
+        for (owner, structure_type), type_bits in self.__structure_bits.items():
+            if (player_index is None or owner == player_index) and (unit_type is None or structure_type == unit_type):
+                bits |= type_bits
+        if player_index is None and unit_type is None:
+            self.__blocked_bits = bits
+        return bits
+
+    def get_mobile_bits(self, player_index=None, unit_type=None):
+        """Gets a bitboard of the tiles holding mobile units, see get_structure_bits
+
+        Args:
+            player_index: Only count units of this player, 0 for you 1 for the enemy. All players if None.
+            unit_type: Only count units of this type. All mobile unit types if None.
+
+        Returns:
+            An int where bit n is set if the nth location of the map holds a matching mobile unit
+
+        """
+        bits = 0
+        for (owner, mobile_type), type_bits in self.__mobile_bits.items():
+            if (player_index is None or owner == player_index) and (unit_type is None or mobile_type == unit_type):
+                bits |= type_bits
+        return bits
+
+    def get_unit_locations(self, player_index=None, unit_type=None, valid_x=None, valid_y=None, location=None, radius=None):
+        """Gets the locations holding matching units, using the bitboards instead of scanning the map
+
+        Args:
+            player_index: Only include units of this player, 0 for you 1 for the enemy. All players if None.
+            unit_type: Only include units of this type. All unit types if None.
+            valid_x: Only include locations whose x is in this list. Any x if None.
+            valid_y: Only include locations whose y is in this list. Any y if None.
+            location: Together with radius, only include locations in range of this location, as in get_locations_in_range
+            radius: See location
+
+        Returns:
+            A list of locations, in the same order the map iterates over them.
+            The filters are combined with a few bitwise ands, so the cost grows with the number of locations found, not the size of the map.
+
+        """
+        bits = 0
+        for type_bits in [self.__structure_bits, self.__mobile_bits]:
+            for (owner, bits_type), unit_bits in type_bits.items():
+                if (player_index is None or owner == player_index) and (unit_type is None or bits_type == unit_type):
+                    bits |= unit_bits
+        if valid_x is not None:
+            bits &= self.__line_mask(_COLUMN_BITS, valid_x)
+        if valid_y is not None:
+            bits &= self.__line_mask(_ROW_BITS, valid_y)
+        if radius is not None:
+            # Centers off the board or between tiles have no tile id and use the exact distance search instead
+            tile = _tile_id(location)
+            if tile >= 0:
+                bits &= _range_bits(tile, radius + self.__hit_radius, inclusive=False)
+            else:
+                range_bits = 0
+                for range_location in self.get_locations_in_range(location, radius):
+                    range_bits |= 1 << _tile_id(range_location)
+                bits &= range_bits
+        return self.get_locations_from_bits(bits)
+
+    def get_units(self, player_index=None, unit_type=None, valid_x=None, valid_y=None, location=None, radius=None):
+        """Gets the matching units, see get_unit_locations for the arguments
+
+        Returns:
+            A list of GameUnits, in the order the map iterates over their locations.
+            For example, get_units(1, TURRET, valid_y=[14, 15]) gets the enemy turrets in the two middle rows
+            and get_units(0, WALL, location=[13, 5], radius=3) gets your walls within 3 tiles of [13, 5].
+
+        """
+        units = []
+        for x, y in self.get_unit_locations(player_index, unit_type, valid_x, valid_y, location, radius):
+            for unit in self.__map[x][y]:
+                if (player_index is None or unit.player_index == player_index) and (unit_type is None or unit.unit_type == unit_type):
+                    units.append(unit)
+        return units
+
+    def __line_mask(self, line_bits, values):
+        """Combines the bitboards of the rows or columns with the given coordinates"""
+        mask = 0
+        for value in values:
+            if 0 <= value < self.ARENA_SIZE:
+                mask |= line_bits[int(value)]
+        return mask
+
+    def get_upgraded_bits(self):
+        """Gets a bitboard of the tiles holding upgraded units, see get_structure_bits
+
+        Returns:
+            An int where bit n is set if the nth location of the map holds an upgraded unit
+
+        """
+        return self.__upgraded_bits
+
+    def is_blocked(self, location):
+        """Checks if a structure stands at a location with a single bit test
+
+        Args:
+            location: A map location or a tile id
+
+        Returns:
+            True if a structure is at the location, False otherwise
+
+        """
+        tile = _tile_id(location)
+        return tile >= 0 and bool(self.get_structure_bits() >> tile & 1)
+
+    def get_occupied_locations(self, player_index=None):
+        """Gets every location holding at least one unit, without scanning the empty tiles
+
+        Args:
+            player_index: Only include locations holding units of this player, 0 for you 1 for the enemy. All players if None.
+
+        Returns:
+            A list of locations, in the same order the map iterates over them
+
+        """
+        return self.get_unit_locations(player_index)
+
+    def get_locations_from_bits(self, bits):
+        """Gets the locations whose bits are set in a bitboard
+
+        Args:
+            bits: A bitboard, see get_structure_bits
+
+        Returns:
+            A list of locations, in the same order the map iterates over them
+
+        """
+        locations = []
+        while bits:
+            lowest_bit = bits & -bits
+            bits ^= lowest_bit
+            tile = lowest_bit.bit_length() - 1
+            locations.append([_TILE_X[tile], _TILE_Y[tile]])
+        return locations
+
+    def get_locations_in_range(self, location, radius, as_tile_ids=False):
         """Gets locations in a circular area around a location
 
         Args:
-            location: The center of our search area
+            location: The center of our search area, a location or a tile id
             radius: The radius of our search area
+            as_tile_ids: If True, return the tile ids of the locations instead, the bit positions used by the bitboards (see get_structure_bits).
+                The result is a shared tuple, so no lists are allocated.
 
         Returns:
             The locations that are within our search area
 
+        The offsets in range of each radius are precomputed, so for a location with integer coordinates the search is a lookup
+        of the stencil, clipped to the board once per location.
         """
         if radius < 0 or radius > self.ARENA_SIZE:
             self.warn("Radius {} was passed to get_locations_in_range. Expected integer between 0 and {}".format(radius, self.ARENA_SIZE))
+        if type(location) == int and 0 <= location < _TILE_COUNT:
+            location = [_TILE_X[location], _TILE_Y[location]]
         if not self.in_arena_bounds(location):
             self._invalid_coordinates(location)
 
         x, y = location
+        if type(x) == int and type(y) == int:
+            tiles = _stencil_tiles(x, y, radius, self.__hit_radius)
+            if as_tile_ids:
+                return tiles
+            return [[_TILE_X[tile], _TILE_Y[tile]] for tile in tiles]
+
         locations = []
         search_radius = math.ceil(radius)
-        getHitRadius = self.config["unitInformation"][0]['getHitRadius']
+        getHitRadius = self.__hit_radius
         for i in range(int(x - search_radius), int(x + search_radius + 1)):
             for j in range(int(y - search_radius), int(y + search_radius + 1)):
                 new_location = [i, j]
                 # A unit with a given range affects all locations who's centers are within that range + get hit radius
                 if self.in_arena_bounds(new_location) and self.distance_between_locations(location, new_location) < radius + getHitRadius:
                     locations.append(new_location)
+        if as_tile_ids:
+            return tuple(_TILE_ID[i][j] for i, j in locations)
         return locations
 
     def distance_between_locations(self, location_1, location_2):
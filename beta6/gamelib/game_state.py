@@ -1,11 +1,14 @@
+import contextlib
+import copy
 import math
-import json
 import sys
 
-from .navigation import ShortestPathFinder
+from . import codec
+from .navigation import FastShortestPathFinder, _LRUCache
+from .coverage import CoverageCalculator
 from .util import send_command, debug_write
 from .unit import GameUnit
-from .game_map import GameMap
+from .game_map import GameMap, _tile_id, _values_to_grid, _range_bits
 
 def is_stationary(unit_type):
     """
@@ -52,7 +55,8 @@ class GameState:
 
         Args:
             * config (JSON): A json object containing information about the game
-            * serialized_string (string): A string containing information about the game state at the start of this turn
+            * serialized_string (string): A string containing information about the game state at the start of this turn.
+              The game state may also be given already decoded, as a dict.
 
         """
         self.serialized_string = serialized_string
@@ -90,7 +94,11 @@ class GameState:
         SP = self.SP
 
         self.game_map = GameMap(self.config)
-        self._shortest_path_finder = ShortestPathFinder()
+        self._shortest_path_finder = FastShortestPathFinder()
+        self._attacker_cache = _LRUCache(1024)
+        self._move_frames = {}
+        self._coverage_calculator = CoverageCalculator(self.config, STRUCTURE_TYPES)
+        self.__max_attack_range = max(unit.get('attackRange', 0) for unit in self.config["unitInformation"])
         self._build_stack = []
         self._deploy_stack = []
         self._player_resources = [
@@ -101,9 +109,9 @@ class GameState:
     def __parse_state(self, state_line):
         """
         Fills in map based on the serialized game state so that self.game_map[x,y] is a list of GameUnits at that location.
-        state_line is the game state as a json string.
+        state_line is the game state as a json string, or the dict it decodes to.
         """
-        state = json.loads(state_line)
+        state = codec.loads(state_line) if isinstance(state_line, str) else state_line
 
         turn_info = state["turnInfo"]
         self.turn_number = int(turn_info[1])
@@ -144,10 +152,10 @@ class GameState:
                         self.game_map[x,y][0].pending_removal = True
                 elif unit_type == UPGRADE:
                     if self.contains_stationary_unit([x,y]):
-                        self.game_map[x,y][0].upgrade()
+                        self.game_map.upgrade([x,y])
                 else:
                     unit = GameUnit(unit_type, self.config, player_number, hp, x, y)
-                    self.game_map[x,y].append(unit)
+                    self.game_map._place_unit(unit)
 
     def __resource_required(self, unit_type):
         return self.SP if is_stationary(unit_type) else self.MP
@@ -175,11 +183,56 @@ class GameState:
         """Submit and end your turn.
             Must be called at the end of your turn or the algo will hang.
         """
-        build_string = json.dumps(self._build_stack)
-        deploy_string = json.dumps(self._deploy_stack)
+        build_string = codec.dumps(self._build_stack)
+        deploy_string = codec.dumps(self._deploy_stack)
         send_command(build_string)
         send_command(deploy_string)
 
+    def fork(self):
+        """Makes a hypothetical copy of this game state, to try out moves without changing the real state.
+        The copy shares the map tiles it does not change with this state (see GameMap.fork), as well as the config
+        and the pathfinding and threat caches, so many forks per turn are affordable.
+        Changes to the copy, such as attempt_spawn, game_map.add_unit or game_map.remove_unit, do not affect this state.
+
+        Returns:
+            A new GameState
+
+        """
+        state = copy.copy(self)
+        state.game_map = self.game_map.fork()
+        state._build_stack = list(self._build_stack)
+        state._deploy_stack = list(self._deploy_stack)
+        state._player_resources = [dict(resources) for resources in self._player_resources]
+        return state
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Tries out changes to this game state and undoes them afterwards.
+        Everything changed inside a with game_state.transaction(): block, through attempt_spawn, attempt_upgrade, attempt_remove
+        or the game_map functions add_unit, remove_unit and upgrade, is rolled back when the block ends, even if it raises.
+        Rolling back costs time proportional to the number of changes, so a depth first search over build orders
+        can share one game state. Transactions can be nested, and the innermost one is rolled back first.
+
+        Units read from game_map[x, y] should not be modified directly inside a transaction, as those changes are not recorded.
+
+        Yields:
+            This game state
+
+        """
+        resources = [dict(player_resources) for player_resources in self._player_resources]
+        build_length = len(self._build_stack)
+        deploy_length = len(self._deploy_stack)
+        self.game_map._begin_transaction()
+        try:
+            yield self
+        finally:
+            self.game_map._rollback_transaction()
+            for player_resources, saved_resources in zip(self._player_resources, resources):
+                player_resources.clear()
+                player_resources.update(saved_resources)
+            del self._build_stack[build_length:]
+            del self._deploy_stack[deploy_length:]
+
     def get_resource(self, resource_type, player_index = 0):
         """Gets a players resources
 
@@ -333,7 +386,7 @@ class GameState:
         stationary = is_stationary(unit_type)
         blocked = self.contains_stationary_unit(location) or (stationary and len(self.game_map[location[0],location[1]]) > 0)
         correct_territory = location[1] < self.HALF_ARENA
-        on_edge = location in (self.game_map.get_edge_locations(self.game_map.BOTTOM_LEFT) + self.game_map.get_edge_locations(self.game_map.BOTTOM_RIGHT))
+        on_edge = self.game_map.is_on_edge(location, self.game_map.BOTTOM_LEFT) or self.game_map.is_on_edge(location, self.game_map.BOTTOM_RIGHT)
 
         if self.enable_warnings:
             fail_reason = ""
@@ -441,7 +494,7 @@ class GameState:
                     if resources[SP] >= costs[SP] and resources[MP] >= costs[MP]:
                         self.__set_resource(SP, 0 - costs[SP])
                         self.__set_resource(MP, 0 - costs[MP])
-                        existing_unit.upgrade()
+                        self.game_map.upgrade([x, y])
                         self._build_stack.append((UPGRADE, x, y))
                         spawned_units += 1
             else:
@@ -476,14 +529,17 @@ class GameState:
         If final point is not on an edge, it is a self destruct path
 
         Args:
-            start_location: The location of a hypothetical unit
+            start_location: The location of a hypothetical unit, or its tile id (see game_map.get_tile_id)
             target_edge: The edge the unit wants to reach. game_map.TOP_LEFT, game_map.BOTTOM_RIGHT, etc. Induced from start_location if None.
 
         Returns:
             A list of locations corresponding to the path the unit would take 
-            to get from it's starting location to the best available end location
+            to get from it's starting location to the best available end location.
+            If start_location is a tile id, the path is a list of tile ids instead.
 
         """
+        if type(start_location) == int:
+            return self.__find_tile_path_to_edge(start_location, target_edge)
         if self.contains_stationary_unit(start_location):
             self.warn("Attempted to perform pathing from blocked starting location {}".format(start_location))
             return
@@ -494,6 +550,181 @@ class GameState:
         end_points = self.game_map.get_edge_locations(target_edge)
         return self._shortest_path_finder.navigate_multiple_endpoints(start_location, end_points, self)
 
+    def __find_tile_path_to_edge(self, start, target_edge):
+        """
+        Helper function for find_path_to_edge, finds a path without leaving tile ids.
+        """
+        if self.game_map.get_tile_id(start) < 0:
+            self.warn("Attempted to perform pathing from invalid tile id {}".format(start))
+            return
+        if self.game_map.is_blocked(start):
+            self.warn("Attempted to perform pathing from blocked starting location {}".format(self.game_map.get_tile_location(start)))
+            return
+
+        if target_edge is None:
+            target_edge = self.get_target_edge(self.game_map.get_tile_location(start))
+        return self._shortest_path_finder.navigate_tiles(start, self.game_map.get_edge_tile_ids(target_edge), self)
+
+    def find_paths_from_all_edges(self, player_index=0):
+        """Gets the paths units would take from every edge location the given player can deploy to.
+        All locations that target the same edge share one pathfinding search, which makes this much cheaper
+        than calling find_path_to_edge once per location.
+
+        Args:
+            player_index: The index corresponding to the deploying player, 0 for you 1 for the enemy
+
+        Returns:
+            A list of paths, one for each deploy location that is not blocked by a structure.
+            Each path starts at its deploy location, see find_path_to_edge.
+
+        """
+        if not player_index == 0 and not player_index == 1:
+            self._invalid_player_index(player_index)
+            return
+
+        if player_index == 0:
+            deploy_edges = [self.game_map.BOTTOM_LEFT, self.game_map.BOTTOM_RIGHT]
+        else:
+            deploy_edges = [self.game_map.TOP_LEFT, self.game_map.TOP_RIGHT]
+
+        paths = []
+        for deploy_edge in deploy_edges:
+            start_locations = self.game_map.get_edge_locations(deploy_edge)
+            target_edge = self.get_target_edge(start_locations[0])
+            end_points = self.game_map.get_edge_locations(target_edge)
+            for path in self._shortest_path_finder.navigate_multiple_starts(start_locations, end_points, self):
+                if path is not None:
+                    paths.append(path)
+        return paths
+
+    def evaluate_placements(self, candidates, unit_type, start_locations=None):
+        """Scores hypothetical structures by how they would change both players' paths.
+        Each candidate is evaluated on its own, as if it was the only structure added to the current map.
+        The map is never modified, and the pathfinding work is shared between candidates,
+        so scoring a few hundred candidates in one turn is affordable.
+
+        Args:
+            candidates: A list of locations to evaluate placing a structure at. The structure belongs to the player whose side of the map it is on.
+            unit_type: The type of structure to place, WALL, TURRET, etc.
+            start_locations: A list with two lists of start locations, one for your units and one for enemy units.
+                Defaults to [[13, 0], [14, 0]] for you and [[13, 27], [14, 27]] for the enemy.
+
+        Returns:
+            A list with one entry per candidate, None for candidates that are off the board or already hold a structure. Each entry is a dict with:
+                * "location": The candidate location
+                * "paths": Two lists, for your units and enemy units, with the path from each start location (None if the start is blocked)
+                * "path_lengths": The number of tiles in each of those paths
+                * "path_damage": The total damage a mobile unit would take per frame from turrets along each path
+
+        """
+        if not is_stationary(unit_type):
+            self._invalid_unit(unit_type)
+            return
+        if start_locations is None:
+            start_locations = [[[13, 0], [14, 0]], [[13, 27], [14, 27]]]
+
+        base_occupancy = self.game_map.get_structure_bits()
+        results = []
+        for candidate in candidates:
+            tile = _tile_id(candidate)
+            if tile < 0 or base_occupancy >> tile & 1:
+                self.warn("Could not evaluate a {} at {}. Location is off the board or holds a structure.".format(unit_type, candidate))
+                results.append(None)
+                continue
+
+            x, y = map(int, candidate)
+            owner = 0 if y < self.HALF_ARENA else 1
+            new_unit = GameUnit(unit_type, self.config, owner, None, x, y)
+            occupancy = base_occupancy | 1 << tile
+            result = {"location": candidate, "paths": [], "path_lengths": [], "path_damage": []}
+            for player_index, starts in enumerate(start_locations):
+                paths = self.__find_paths_with_occupancy(starts, occupancy)
+                result["paths"].append(paths)
+                result["path_lengths"].append([None if path is None else len(path) for path in paths])
+                result["path_damage"].append([None if path is None else self.__path_damage(path, player_index, new_unit) for path in paths])
+            results.append(result)
+        return results
+
+    def __find_paths_with_occupancy(self, start_locations, occupancy):
+        """
+        Helper function for evaluate_placements, finds paths on a hypothetical board.
+        """
+        paths = []
+        for start_location in start_locations:
+            end_points = self.game_map.get_edge_locations(self.get_target_edge(start_location))
+            paths.append(self._shortest_path_finder.navigate_multiple_starts([start_location], end_points, self, occupancy)[0])
+        return paths
+
+    def __path_damage(self, path, player_index, new_unit):
+        """
+        Helper function for evaluate_placements, sums the damage per frame to a mobile unit of the given player along a path.
+        """
+        damage = self.game_map.get_path_damage(path, player_index)
+        for x, y in path:
+            if new_unit.player_index != player_index and self.game_map.distance_between_locations([x, y], [new_unit.x, new_unit.y]) <= new_unit.attackRange:
+                damage += new_unit.damage_i
+        return damage
+
+    def get_path_timing(self, unit_type, path):
+        """Gets the frame at which a mobile unit reaches each tile of a path.
+        A unit moves once every 1/speed frames, so every unit of a stack deployed together shares the same timing.
+
+        Args:
+            unit_type: The type of the mobile unit, SCOUT, DEMOLISHER or INTERCEPTOR
+            path: A path, as returned by find_path_to_edge with a location or a tile id
+
+        Returns:
+            A list with the frame, counted from deployment, at which the unit reaches each tile of the path
+
+        """
+        move_frames = self.get_move_frames(unit_type)
+        if move_frames is None:
+            return
+        return move_frames[:len(path)]
+
+    def get_paths_timing(self, unit_type, paths):
+        """Gets the timing of several paths at once, see get_path_timing
+
+        Args:
+            unit_type: The type of the mobile unit, SCOUT, DEMOLISHER or INTERCEPTOR
+            paths: A list of paths, as returned by find_path_to_edge. Entries may be None.
+
+        Returns:
+            A list with the timing of each path, None for paths that are None
+
+        """
+        move_frames = self.get_move_frames(unit_type)
+        if move_frames is None:
+            return
+        return [None if path is None else move_frames[:len(path)] for path in paths]
+
+    def get_move_frames(self, unit_type):
+        """Gets the frame at which a mobile unit makes each of its moves, the table get_path_timing slices paths from.
+
+        Args:
+            unit_type: The type of the mobile unit, SCOUT, DEMOLISHER or INTERCEPTOR
+
+        Returns:
+            A list where entry n is the frame, counted from deployment, of the unit's nth move, for every path length possible
+            on the board. The list is cached and shared, so do not modify it.
+
+        """
+        if unit_type not in ALL_UNITS or is_stationary(unit_type):
+            self._invalid_unit(unit_type)
+            return
+
+        move_frames = self._move_frames.get(unit_type)
+        if move_frames is None:
+            speed = self.config["unitInformation"][UNIT_TYPE_TO_INDEX[unit_type]].get("speed", 0)
+            if speed <= 0:
+                self.warn("Unit {} has no speed and never moves".format(unit_type))
+                return
+            # Frame at which the unit makes its nth move, for every path length possible on the board.
+            # Rounded before ceil so that speeds like 0.1 don't pick up an extra frame from float error
+            move_frames = [math.ceil(round(moves / speed, 6)) for moves in range(self.ARENA_SIZE * self.ARENA_SIZE)]
+            self._move_frames[unit_type] = move_frames
+        return move_frames
+
     def contains_stationary_unit(self, location):
         """Check if a location is blocked, return structures unit if it is
 
@@ -507,6 +738,8 @@ class GameState:
         if not self.game_map.in_arena_bounds(location):
             self.warn('Checked for stationary unit outside of arena bounds')
             return False
+        if not self.game_map.is_blocked(location):
+            return False
         x, y = map(int, location)
         for unit in self.game_map[x,y]:
             if unit.stationary:
@@ -610,34 +843,138 @@ class GameState:
                     target_x_distance = unit_x_distance
         return target
 
+    def get_targets(self, attacking_units):
+        """Gets the target of many units at once, based on the current map of the game board.
+        Every target is the one get_target would choose, with the same priority order, but the board is only looked at once:
+        the tiles holding possible targets are kept as bitboards, so an attacker with nothing in range costs a single bitwise and.
+
+        Args:
+            attacking_units: A list of GameUnits
+
+        Returns:
+            A list with the GameUnit each attacking unit would choose to attack, None for units without a target
+
+        """
+        hit_radius = self.config["unitInformation"][0].get("getHitRadius", 0)
+        mobile_bits = [self.game_map.get_mobile_bits(0), self.game_map.get_mobile_bits(1)]
+        structure_bits = [self.game_map.get_structure_bits(0), self.game_map.get_structure_bits(1)]
+        targets = []
+        for attacking_unit in attacking_units:
+            tile = _tile_id([attacking_unit.x, attacking_unit.y]) if isinstance(attacking_unit, GameUnit) else -1
+            if tile < 0 or attacking_unit.player_index not in [0, 1]:
+                targets.append(self.get_target(attacking_unit))
+                continue
+
+            enemy_index = 1 - attacking_unit.player_index
+            candidate_bits = 0
+            if attacking_unit.damage_i != 0:
+                candidate_bits |= mobile_bits[enemy_index]
+            if attacking_unit.damage_f != 0:
+                candidate_bits |= structure_bits[enemy_index]
+            candidate_bits &= _range_bits(tile, attacking_unit.attackRange + hit_radius, inclusive=False)
+            targets.append(self.__choose_target(attacking_unit, self.game_map.get_locations_from_bits(candidate_bits)) if candidate_bits else None)
+        return targets
+
+    def __choose_target(self, attacking_unit, locations):
+        """
+        Helper function for get_targets. Ranks the units at the given locations the way get_target does, as a tuple compared in one go:
+        mobile units first, then nearest, lowest health, lowest y (highest for the enemy) and largest distance from the center column.
+        Ties go to the unit get_target meets first, which scans the locations by x, then y, then list order.
+        """
+        attacker_location = [attacking_unit.x, attacking_unit.y]
+        y_sign = 1 if attacking_unit.player_index == 0 else -1
+        best_key = None
+        target = None
+        for location in locations:
+            distance = self.game_map.distance_between_locations(location, attacker_location)
+            for index, unit in enumerate(self.game_map[location]):
+                if unit.player_index == attacking_unit.player_index or (attacking_unit.damage_f == 0 and unit.stationary) or (attacking_unit.damage_i == 0 and not unit.stationary):
+                    continue
+                key = (unit.stationary, distance, unit.health, y_sign * unit.y, -abs(self.HALF_ARENA - 0.5 - unit.x), unit.x, unit.y, index)
+                if best_key is None or key < best_key:
+                    best_key = key
+                    target = unit
+        return target
+
+    def get_coverage(self, player_index, structure_bits=None, upgraded_bits=None):
+        """Gets the damage structures can deal to units of the given player on every tile, computed for the whole board at once.
+        Unlike game_map.get_threat, the structures can be given as bitboards, so hypothetical boards are as cheap to score as the real one.
+
+        Args:
+            player_index: The index corresponding to the defending player, 0 for you 1 for the enemy
+            structure_bits: A dict mapping structure types to bitboards of the attacking player's structures, see game_map.get_structure_bits.
+                Defaults to the structures of the other player on the map.
+            upgraded_bits: A bitboard of the upgraded structures. Defaults to the upgraded units on the map.
+
+        Returns:
+            A dict with the keys "attackers", "damage_i" and "damage_f", each holding an ARENA_SIZE by ARENA_SIZE grid indexed
+            as grid[x][y], with the number of structures that can hit the tile and their summed damage to mobile units and to structures.
+
+        """
+        if not player_index == 0 and not player_index == 1:
+            self._invalid_player_index(player_index)
+            return
+        if structure_bits is None:
+            structure_bits = {unit_type: self.game_map.get_structure_bits(1 - player_index, unit_type) for unit_type in STRUCTURE_TYPES}
+        if upgraded_bits is None:
+            upgraded_bits = self.game_map.get_upgraded_bits()
+
+        fields = self._coverage_calculator.get_fields(structure_bits, upgraded_bits)
+        return dict(zip(["attackers", "damage_i", "damage_f"], map(_values_to_grid, fields)))
+
     def get_attackers(self, location, player_index):
         """Gets the stationary units threatening a given location
 
         Args:
-            location: The location of a hypothetical defender
+            location: The location of a hypothetical defender, or its tile id (see game_map.get_tile_id)
             player_index: The index corresponding to the defending player, 0 for you 1 for the enemy
 
         Returns:
             A list of units that would attack a unit controlled by the given player at the given location
 
+        To only count the attackers or sum their damage, game_map.get_threat and game_map.get_path_damage are faster.
         """
 
         if not player_index == 0 and not player_index == 1:
             self._invalid_player_index(player_index)
+        if type(location) == int and self.game_map.get_tile_id(location) >= 0:
+            location = self.game_map.get_tile_location(location)
         if not self.game_map.in_arena_bounds(location):
             self.warn("Location {} is not in the arena bounds.".format(location))
 
+        # Which tiles hold attackers only depends on the layout, so it is cached per layout key.
+        # The reflected query on the reflected layout has the reflected answer.
+        x, y = location
+        cache_key = (self.game_map.get_layout_key(), x, y, player_index)
+        attacker_locations = self._attacker_cache.get(cache_key)
+        if attacker_locations is None:
+            mirrored_locations = self._attacker_cache.get((self.game_map.get_layout_key(True), self.ARENA_SIZE - 1 - x, y, player_index))
+            if mirrored_locations is not None:
+                attacker_locations = sorted([self.ARENA_SIZE - 1 - mirrored_x, mirrored_y] for mirrored_x, mirrored_y in mirrored_locations)
+            else:
+                attacker_locations = self.__find_attacker_locations(location, player_index)
+            self._attacker_cache.put(cache_key, attacker_locations)
+
         attackers = []
+        for location_unit in attacker_locations:
+            for unit in self.game_map[location_unit]:
+                if self.__is_attacker(unit, location, location_unit, player_index):
+                    attackers.append(unit)
+        return attackers
+
+    def __find_attacker_locations(self, location, player_index):
         """
-        Get locations in the range of TURRET units
+        Helper function for get_attackers, gets the locations holding units that can attack the given location.
         """
-        max_range = 0
-        for unit in self.config["unitInformation"]:
-            if unit.get('attackRange', 0) >= max_range:
-                max_range = unit.get('attackRange', 0)
-        possible_locations= self.game_map.get_locations_in_range(location, max_range)
+        possible_locations= self.game_map.get_locations_in_range(location, self.__max_attack_range)
+        attacker_locations = []
         for location_unit in possible_locations:
             for unit in self.game_map[location_unit]:
-                if unit.damage_i + unit.damage_f > 0 and unit.player_index != player_index and self.game_map.distance_between_locations(location, location_unit) <= unit.attackRange:
-                    attackers.append(unit)
-        return attackers
+                if self.__is_attacker(unit, location, location_unit, player_index):
+                    attacker_locations.append(location_unit)
+                    break
+        return attacker_locations
+
+    def __is_attacker(self, unit, location, location_unit, player_index):
+        """Helper function for __find_attacker_locations, checks if a unit at location_unit belongs to the opponent of player_index and can attack location"""
+        return unit.damage_i + unit.damage_f > 0 and unit.player_index != player_index and self.game_map.distance_between_locations(location, location_unit) <= unit.attackRange
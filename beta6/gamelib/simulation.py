@@ -0,0 +1,216 @@
+import copy
+
+EVENT_TYPES = ["selfDestruct", "breach", "damage", "shield", "move", "spawn", "death", "attack", "melee"]
+
+class ActionSimulator:
+    """Predicts what will happen during the action phase of a turn.
+
+    The simulation runs on a private copy of a GameState, so it never changes the state passed in.
+    Structures are taken from the map as they stand, and every mobile unit on the map, such as the
+    units placed by attempt_spawn or added with game_map.add_unit, is spawned on the first frame.
+
+    Each frame is resolved in this order:
+        1. Supporting structures shield friendly mobile units in their shield range, once per unit.
+        2. Mobile units whose move is due step along their path. A unit reaching its target edge
+           breaches, a unit at the end of a path that does not reach its edge, or with no path at all, self destructs.
+        3. Every unit with an attack picks its target with GameState.get_targets, based on the board at
+           the start of this step, then all attacks deal their damage at once.
+        4. Units left without health are removed. If a structure was destroyed, mobile units re-path.
+
+    This is an approximation of the game engine, not a copy of it: paths are recomputed from scratch
+    when the board changes, so a unit's previous move direction does not carry over into tie-breaking.
+
+    Attributes :
+        * game_state (:obj: GameState): The state simulations start from. It is never modified.
+        * max_frames (int): The simulation stops after this many frames even if units are still moving.
+
+    """
+    def __init__(self, game_state, max_frames=200):
+        self.game_state = game_state
+        self.max_frames = max_frames
+
+    def simulate(self):
+        """Runs the action phase once
+
+        Returns:
+            A dict with the following keys :
+                * frames: A list with the events of each frame, shaped like the "events" dict of an action frame sent by the engine
+                * events: The events of all frames combined
+                * my_health: Your health after the action phase
+                * enemy_health: Your opponent's health after the action phase
+
+        """
+        from .game_state import UNIT_TYPE_TO_INDEX
+        self.__type_index = UNIT_TYPE_TO_INDEX
+        state = self.__copy_state()
+        self.__state = state
+        self.__health = [state.my_health, state.enemy_health]
+        self.__ids = {}
+        self.__routes = {}
+
+        units = []
+        for location in state.game_map:
+            for unit in state.game_map[location]:
+                self.__ids[id(unit)] = str(len(self.__ids) + 1)
+                units.append(unit)
+
+        frames = []
+        events = self.__empty_events()
+        for unit in units:
+            if not unit.stationary:
+                self.__spawn(unit, events)
+
+        for frame in range(self.max_frames):
+            if frame > 0:
+                events = self.__empty_events()
+            self.__shield_units(units, events)
+            self.__move_units(units, frame, events)
+            self.__attack(units, events)
+            units = self.__remove_dead_units(units, events)
+            frames.append(events)
+            if not self.__routes:
+                break
+
+        combined = self.__empty_events()
+        for frame_events in frames:
+            for event_type in EVENT_TYPES:
+                combined[event_type].extend(frame_events[event_type])
+        return {
+            "frames": frames,
+            "events": combined,
+            "my_health": self.__health[0],
+            "enemy_health": self.__health[1]}
+
+    def __copy_state(self):
+        """
+        Copies the game state, sharing the config, the path caches and the coverage kernels with the original since none of them is changed by simulating.
+        """
+        game_state = self.game_state
+        shared = [game_state.config, game_state._shortest_path_finder, game_state._attacker_cache, game_state._coverage_calculator]
+        return copy.deepcopy(game_state, {id(obj): obj for obj in shared})
+
+    def __empty_events(self):
+        return {event_type: [] for event_type in EVENT_TYPES}
+
+    def __describe(self, unit):
+        """The unit type index, id and player number the engine uses to describe a unit in events"""
+        return self.__type_index[unit.unit_type], self.__ids[id(unit)], unit.player_index + 1
+
+    def __spawn(self, unit, events):
+        state = self.__state
+        location = [unit.x, unit.y]
+        target_edge = state.get_target_edge(location)
+        self.__routes[id(unit)] = {
+            "unit": unit,
+            "target_edge": target_edge,
+            "path": state.find_path_to_edge(location, target_edge),
+            "step": 0,
+            "moves": 0,
+            "shielded_by": set()}
+        unit_type, unit_id, player = self.__describe(unit)
+        events["spawn"].append([location, unit_type, unit_id, player])
+
+    def __shield_units(self, units, events):
+        state = self.__state
+        for shielder in units:
+            if not shielder.stationary or shielder.shieldPerUnit <= 0 or shielder.shieldRange <= 0:
+                continue
+            for location in state.game_map.get_locations_in_range([shielder.x, shielder.y], shielder.shieldRange):
+                for unit in state.game_map[location]:
+                    route = self.__routes.get(id(unit))
+                    if route is None or unit.player_index != shielder.player_index or id(shielder) in route["shielded_by"]:
+                        continue
+                    route["shielded_by"].add(id(shielder))
+                    unit.health += shielder.shieldPerUnit
+                    shielder_type, shielder_id, player = self.__describe(shielder)
+                    events["shield"].append([[shielder.x, shielder.y], location, shielder.shieldPerUnit, shielder_type, shielder_id, self.__ids[id(unit)], player])
+
+    def __move_units(self, units, frame, events):
+        state = self.__state
+        for unit in units:
+            route = self.__routes.get(id(unit))
+            if route is None or unit.health <= 0:
+                continue
+            if frame < state.get_move_frames(unit.unit_type)[route["moves"] + 1]:
+                continue
+            path = route["path"]
+            if path is None or route["step"] + 1 >= len(path):
+                self.__self_destruct(unit, route, events)
+                continue
+
+            route["step"] += 1
+            route["moves"] += 1
+            old_location = [unit.x, unit.y]
+            new_location = path[route["step"]]
+            state.game_map._take_unit(unit)
+            unit.x, unit.y = new_location
+            state.game_map._place_unit(unit)
+            unit_type, unit_id, player = self.__describe(unit)
+            events["move"].append([old_location, new_location, [0, 0], unit_type, unit_id, player])
+
+            if state.game_map.is_on_edge(new_location, route["target_edge"]):
+                self.__breach(unit, events)
+
+    def __breach(self, unit, events):
+        state = self.__state
+        damage = state.config["unitInformation"][self.__type_index[unit.unit_type]].get("playerBreachDamage", 1)
+        self.__health[1 - unit.player_index] -= damage
+        unit_type, unit_id, player = self.__describe(unit)
+        events["breach"].append([[unit.x, unit.y], damage, unit_type, unit_id, player])
+        del self.__routes[id(unit)]
+        state.game_map._take_unit(unit)
+        unit.health = 0
+
+    def __self_destruct(self, unit, route, events):
+        state = self.__state
+        unit_info = state.config["unitInformation"][self.__type_index[unit.unit_type]]
+        if route["moves"] >= unit_info.get("selfDestructStepsRequired", 5):
+            location = [unit.x, unit.y]
+            hit_locations = []
+            for target_location in state.game_map.get_locations_in_range(location, unit_info.get("selfDestructRange", 0)):
+                for target in state.game_map[target_location]:
+                    if target.player_index == unit.player_index or target.health <= 0:
+                        continue
+                    damage = unit_info.get("selfDestructDamageTower", 0) if target.stationary else unit_info.get("selfDestructDamageWalker", 0)
+                    target.health -= damage
+                    target_type, target_id, target_player = self.__describe(target)
+                    events["damage"].append([target_location, damage, target_type, target_id, target_player])
+                    hit_locations.append(target_location)
+            unit_type, unit_id, player = self.__describe(unit)
+            events["selfDestruct"].append([location, hit_locations, unit_info.get("selfDestructDamageTower", 0), unit_type, unit_id, player])
+        unit.health = 0
+
+    def __attack(self, units, events):
+        state = self.__state
+        attackers = [unit for unit in units if unit.health > 0 and unit.damage_i + unit.damage_f > 0]
+        attacks = [(attacker, target) for attacker, target in zip(attackers, state.get_targets(attackers)) if target is not None]
+
+        for attacker, target in attacks:
+            damage = attacker.damage_f if target.stationary else attacker.damage_i
+            target.health -= damage
+            attacker_type, attacker_id, player = self.__describe(attacker)
+            target_type, target_id, target_player = self.__describe(target)
+            events["attack"].append([[attacker.x, attacker.y], [target.x, target.y], damage, attacker_type, attacker_id, target_id, player])
+            events["damage"].append([[target.x, target.y], damage, target_type, target_id, target_player])
+
+    def __remove_dead_units(self, units, events):
+        state = self.__state
+        alive = []
+        structure_destroyed = False
+        for unit in units:
+            if unit.health > 0:
+                alive.append(unit)
+                continue
+            if id(unit) in self.__routes or unit.stationary:
+                state.game_map._take_unit(unit)
+                unit_type, unit_id, player = self.__describe(unit)
+                events["death"].append([[unit.x, unit.y], unit_type, unit_id, player, False])
+            self.__routes.pop(id(unit), None)
+            structure_destroyed = structure_destroyed or unit.stationary
+
+        if structure_destroyed:
+            for route in self.__routes.values():
+                unit = route["unit"]
+                route["path"] = state.find_path_to_edge([unit.x, unit.y], route["target_edge"])
+                route["step"] = 0
+        return alive
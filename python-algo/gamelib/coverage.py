@@ -0,0 +1,102 @@
+import math
+import sys
+from array import array
+
+from .unit import GameUnit
+from .game_map import _ARENA_SIZE, _TILE_COUNT, _TILE_X, _TILE_Y
+
+_LANE_BITS = 16
+
+class CoverageCalculator:
+    """Builds the damage fields of all structures on the board at once.
+
+    The structures of one type and upgrade level are given as a bitboard, see GameMap.get_structure_bits.
+    The bitboard is spread onto a padded grid packed into a single integer, with one 16 bit lane per tile,
+    then convolved with a disk shaped kernel by adding up shifted copies of it. Lane n of the sum holds the
+    number of those structures that can hit tile n, so a field costs one integer addition per kernel tile
+    however many structures there are.
+
+    A structure covers a tile when their distance is less than its attackRange plus getHitRadius,
+    the rule used by GameState.get_target. Upgraded structures use the values of the upgrade entry of the config.
+
+    Attributes :
+        * config (JSON): Contains information about the game
+
+    """
+    def __init__(self, config, structure_types):
+        """Precomputes the kernels of every type of structure that can attack
+
+        Args:
+            config (JSON): Contains information about the game
+            structure_types: The shorthands of the structure types, see GameState.STRUCTURE_TYPES
+
+        """
+        self.config = config
+        hit_radius = config["unitInformation"][0].get("getHitRadius", 0)
+        attacker_types = []
+        for unit_type in structure_types:
+            unit = GameUnit(unit_type, config)
+            for upgraded in [False, True]:
+                if upgraded:
+                    unit.upgrade()
+                if unit.damage_i + unit.damage_f > 0:
+                    attacker_types.append((unit_type, upgraded, unit.damage_i, unit.damage_f, unit.attackRange + hit_radius))
+
+        padding = max([int(math.ceil(reach)) for _, _, _, _, reach in attacker_types] + [0])
+        width = _ARENA_SIZE + 2 * padding
+        self.__lanes = tuple((_TILE_Y[tile] + padding) * width + _TILE_X[tile] + padding for tile in range(_TILE_COUNT))
+        self.__size = width * width * _LANE_BITS // 8
+        self.__attacker_types = []
+        for unit_type, upgraded, damage_i, damage_f, reach in attacker_types:
+            shifts = []
+            for dy in range(-padding, padding + 1):
+                for dx in range(-padding, padding + 1):
+                    if math.sqrt(dx**2 + dy**2) < reach:
+                        shifts.append((dy * width + dx) * _LANE_BITS)
+            self.__attacker_types.append((unit_type, upgraded, damage_i, damage_f, tuple(shifts)))
+
+    def get_fields(self, structure_bits, upgraded_bits=0):
+        """Computes the coverage of a set of structures belonging to one player
+
+        Args:
+            structure_bits: A dict mapping each structure type to a bitboard of the tiles holding that type
+            upgraded_bits: A bitboard of the tiles holding upgraded units
+
+        Returns:
+            Three lists indexed by tile id: the number of structures that can hit each tile,
+            their summed damage to mobile units (damage_i) and their summed damage to structures (damage_f)
+
+        """
+        attackers = [0] * _TILE_COUNT
+        damage_i = [0] * _TILE_COUNT
+        damage_f = [0] * _TILE_COUNT
+        for unit_type, upgraded, unit_damage_i, unit_damage_f, shifts in self.__attacker_types:
+            bits = structure_bits.get(unit_type, 0)
+            bits = bits & upgraded_bits if upgraded else bits & ~upgraded_bits
+            if not bits:
+                continue
+            counts = self.__convolve(bits, shifts)
+            for tile, lane in enumerate(self.__lanes):
+                count = counts[lane]
+                if count:
+                    attackers[tile] += count
+                    damage_i[tile] += count * unit_damage_i
+                    damage_f[tile] += count * unit_damage_f
+        return attackers, damage_i, damage_f
+
+    def __convolve(self, bits, shifts):
+        """Counts, for every lane of the padded grid, the set bits of a bitboard within the kernel described by shifts"""
+        lanes = self.__lanes
+        spread = 0
+        while bits:
+            lowest_bit = bits & -bits
+            bits ^= lowest_bit
+            spread |= 1 << lanes[lowest_bit.bit_length() - 1] * _LANE_BITS
+
+        total = 0
+        for shift in shifts:
+            total += spread << shift if shift >= 0 else spread >> -shift
+        counts = array("H", total.to_bytes(self.__size, "little"))
+        if sys.byteorder == "big":
+            counts.byteswap()
+        return counts
@@ -1,7 +1,13 @@
 import unittest
 import json
+import math
+import random
 from .game_state import GameState
 from .unit import GameUnit
+from .navigation import ShortestPathFinder
+from .simulation import ActionSimulator
+from .util import decode_keys
+from . import codec
 
 class BasicTests(unittest.TestCase):
 
@@ -256,6 +262,558 @@ class BasicTests(unittest.TestCase):
         game.game_map.add_unit("DF", [14,14], 1)
         self.assertEqual(3, len(game.get_attackers([13,13], 0)), "We should be in danger from 3 places")
 
+    def make_random_map(self, seed, density):
+        game = self.make_turn_0_map()
+        rng = random.Random(seed)
+        for location in list(game.game_map):
+            if rng.random() < density:
+                game.game_map.add_unit(rng.choice(["FF", "EF", "DF"]), location, 0 if location[1] < game.HALF_ARENA else 1)
+        return game
+
+    def test_fast_pathfinder_matches_reference(self):
+        for seed, density in enumerate([0.0, 0.1, 0.3, 0.5, 0.6]):
+            game = self.make_random_map(seed, density)
+            rng = random.Random(seed)
+            open_locations = [location for location in game.game_map if not game.contains_stationary_unit(location)]
+            for start in rng.sample(open_locations, 10):
+                for edge in range(4):
+                    expected = ShortestPathFinder().navigate_multiple_endpoints(start, game.game_map.get_edge_locations(edge), game)
+                    self.assertEqual(expected, game.find_path_to_edge(start, edge), "Paths differ from {} to edge {}".format(start, edge))
+
+    def test_distance_field_cache(self):
+        game = self.make_turn_0_map()
+        finder = game._shortest_path_finder
+        path = game.find_path_to_edge([13, 0])
+        self.assertEqual(path, game.find_path_to_edge([13, 0]), "Cached path differs")
+        game.find_path_to_edge([12, 1])
+        self.assertEqual(1, len(finder._field_cache), "Queries against the same board and edge should share one distance field")
+
+        game.game_map.add_unit("FF", path[3], 0)
+        expected = ShortestPathFinder().navigate_multiple_endpoints([13, 0], game.game_map.get_edge_locations(game.game_map.TOP_RIGHT), game)
+        self.assertEqual(expected, game.find_path_to_edge([13, 0]), "Cache was not invalidated by a new structure")
+        self.assertEqual(2, len(finder._field_cache))
+
+    def test_incremental_distance_fields(self):
+        game = self.make_random_map(7, 0.3)
+        finder = game._shortest_path_finder
+        rng = random.Random(7)
+        locations = list(game.game_map)
+        for _ in range(40):
+            location = rng.choice(locations)
+            if game.contains_stationary_unit(location):
+                game.game_map.remove_unit(location)
+            else:
+                game.game_map.add_unit("FF", location)
+            start = rng.choice([location for location in locations if not game.contains_stationary_unit(location)])
+            for edge in range(4):
+                end_points = game.game_map.get_edge_locations(edge)
+                expected = ShortestPathFinder().navigate_multiple_endpoints(start, end_points, game)
+                self.assertEqual(expected, game.find_path_to_edge(start, edge), "Updated distance field gave a different path")
+            for targets, (occupancy, pathlength) in finder._latest_fields._entries.items():
+                if occupancy == finder._occupancy:
+                    self.assertEqual(finder._validate(targets), pathlength, "Updated distance field differs from a fresh search")
+
+    def test_paths_from_all_edges(self):
+        game = self.make_random_map(3, 0.25)
+        for player_index in [0, 1]:
+            spawn_edges = [game.game_map.BOTTOM_LEFT, game.game_map.BOTTOM_RIGHT] if player_index == 0 else [game.game_map.TOP_LEFT, game.game_map.TOP_RIGHT]
+            expected = []
+            for edge in spawn_edges:
+                for location in game.game_map.get_edge_locations(edge):
+                    if not game.contains_stationary_unit(location):
+                        expected.append(game.find_path_to_edge(location))
+            self.assertEqual(expected, game.find_paths_from_all_edges(player_index), "Batched paths differ for player {}".format(player_index))
+
+    def test_structure_bitboards(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        self.assertEqual(0, game_map.get_structure_bits(), "An empty map should have no structures")
+        game_map.add_unit("FF", [13, 0], 0)
+        game_map.add_unit("DF", [14, 27], 1)
+        game_map.add_unit("PI", [12, 1], 0)
+        self.assertEqual(1 << 0, game_map.get_structure_bits(0), "Bit 0 should be the first location of the map")
+        self.assertEqual(0, game_map.get_structure_bits(0, "DF"), "No friendly turrets were placed")
+        self.assertEqual([[13, 0], [14, 27]], game_map.get_locations_from_bits(game_map.get_structure_bits()))
+        self.assertEqual(list(game_map), game_map.get_locations_from_bits((1 << 420) - 1), "Bits should follow the map iteration order")
+        self.assertTrue(game_map.is_blocked([14, 27]))
+        self.assertFalse(game_map.is_blocked([12, 1]), "Mobile units do not block")
+
+        game_map.remove_unit([14, 27])
+        game_map[13, 0] = []
+        self.assertEqual(0, game_map.get_structure_bits(), "Removed structures are still in the bitboards")
+
+        turn = """{"p2Units":[[],[],[[13,20,60.0,"1"]],[],[],[],[],[[13,20,60.0,"2"]]],"turnInfo":[0,1,-1],"p1Stats":[30.0,25.0,5.0,0],"p1Units":[[[3,12,75.0,"3"]],[],[],[],[],[],[],[]],"p2Stats":[30.0,25.0,5.0,0],"events":{}}"""
+        parsed = GameState(game.config, turn)
+        self.assertEqual([[3, 12]], parsed.game_map.get_locations_from_bits(parsed.game_map.get_structure_bits(0, "FF")))
+        self.assertEqual([[13, 20]], parsed.game_map.get_locations_from_bits(parsed.game_map.get_structure_bits(1, "DF")))
+
+    def assert_threat_matches_attackers(self, game):
+        for location in game.game_map:
+            for player_index in [0, 1]:
+                attackers = game.get_attackers(location, player_index)
+                expected = (len(attackers), sum(unit.damage_i for unit in attackers), sum(unit.damage_f for unit in attackers))
+                self.assertEqual(expected, game.game_map.get_threat(location, player_index), "Threat differs at {} for player {}".format(location, player_index))
+
+    def test_threat_map(self):
+        game = self.make_random_map(5, 0.3)
+        self.assert_threat_matches_attackers(game)
+        rng = random.Random(5)
+        locations = list(game.game_map)
+        for _ in range(20):
+            location = rng.choice(locations)
+            if game.contains_stationary_unit(location) and rng.random() < 0.5:
+                game.game_map.upgrade(location)
+            elif game.contains_stationary_unit(location):
+                game.game_map.remove_unit(location)
+            else:
+                game.game_map.add_unit("DF", location, 0 if location[1] < game.HALF_ARENA else 1)
+        self.assert_threat_matches_attackers(game)
+
+        path = game.find_path_to_edge([13, 0])
+        self.assertEqual(sum(game.game_map.get_threat(location, 0)[1] for location in path), game.game_map.get_path_damage(path, 0))
+        x, y = path[-1]
+        self.assertEqual(game.game_map.get_threat(path[-1], 0)[0], game.game_map.get_threat_map(0)["attackers"][x][y])
+
+    def test_coverage(self):
+        game = self.make_random_map(6, 0.3)
+        for location in list(game.game_map)[::7]:
+            if game.contains_stationary_unit(location):
+                game.game_map.upgrade(location)
+        for player_index in [0, 1]:
+            coverage = game.get_coverage(player_index)
+            for x, y in game.game_map:
+                attackers = [unit for unit in game.get_attackers([x, y], player_index) if unit.stationary]
+                self.assertEqual(len(attackers), coverage["attackers"][x][y], "Coverage differs at {}".format([x, y]))
+                self.assertEqual(sum(unit.damage_i for unit in attackers), coverage["damage_i"][x][y])
+                self.assertEqual(sum(unit.damage_f for unit in attackers), coverage["damage_f"][x][y])
+
+        turret = [13, 20]
+        game.game_map.remove_unit(turret)
+        coverage = game.get_coverage(0)
+        hypothetical = {unit_type: game.game_map.get_structure_bits(1, unit_type) for unit_type in ["FF", "EF", "DF"]}
+        hypothetical["DF"] |= 1 << list(game.game_map).index(turret)
+        self.assertEqual(coverage["attackers"][13][18] + 1, game.get_coverage(0, hypothetical)["attackers"][13][18], "A hypothetical turret should add coverage")
+
+    def test_shield_map(self):
+        game = self.make_turn_0_map()
+        support_info = game.config["unitInformation"][1]
+        support_info.update({"shieldRange": 3, "shieldPerUnit": 2})
+        support_info["upgrade"].update({"shieldRange": 5, "shieldPerUnit": 4})
+        game_map = game.game_map
+        game_map.add_unit("EF", [13, 3], 0)
+        game_map.add_unit("EF", [10, 5], 0)
+        game_map.add_unit("EF", [13, 24], 1)
+        self.assertEqual(4, game_map.get_shield([12, 4], 0), "Both supports cover [12, 4]")
+        self.assertEqual(0, game_map.get_shield([12, 4], 1), "Supports only shield their owner's units")
+
+        game_map.upgrade([13, 3])
+        game_map.remove_unit([10, 5])
+        game_map.add_unit("EF", [16, 6], 0)
+        for location in game_map:
+            expected = 0
+            for support_location in game_map.get_locations_in_range(location, 5):
+                for unit in game_map[support_location]:
+                    if unit.player_index == 0 and game_map.distance_between_locations(location, support_location) < unit.shieldRange + 0.01:
+                        expected += unit.shieldPerUnit
+            self.assertEqual(expected, game_map.get_shield(location, 0), "Shield differs at {}".format(location))
+        x, y = 16, 8
+        self.assertEqual(game_map.get_shield([x, y], 0), game_map.get_shield_map(0)[x][y])
+
+        path = game.find_path_to_edge([13, 0])
+        self.assertEqual(6, game_map.get_path_shield(path, 0), "Each support should shield a unit once")
+        self.assertEqual(0, game_map.get_path_shield([[0, 13]], 0))
+
+    def test_batched_targets(self):
+        for seed in range(4):
+            game = self.make_random_map(seed, 0.2)
+            rng = random.Random(seed)
+            locations = [location for location in game.game_map if not game.contains_stationary_unit(location)]
+            for location in rng.sample(locations, 40):
+                for _ in range(rng.randint(1, 3)):
+                    game.game_map.add_unit(rng.choice(["PI", "EI", "SI"]), location, rng.randint(0, 1))
+            units = [unit for location in game.game_map for unit in game.game_map[location]]
+            for unit in units:
+                if rng.random() < 0.3:
+                    unit.health = rng.choice([1, 5])
+                if unit.stationary and rng.random() < 0.2:
+                    game.game_map.upgrade([unit.x, unit.y])
+            expected = [game.get_target(unit) for unit in units]
+            targets = game.get_targets(units)
+            for unit, expected_target, target in zip(units, expected, targets):
+                self.assertIs(expected_target, target, "Targets differ for {}".format(unit))
+
+    def test_unit_queries(self):
+        game = self.make_random_map(7, 0.4)
+        game_map = game.game_map
+        game_map.add_unit("PI", [13, 2], 0)
+        game_map.add_unit("PI", [13, 2], 1)
+        queries = [(1, "DF", None, [14, 15], None, None), (0, "FF", None, None, [13, 5], 3), (None, None, [0, 13, 27], None, None, None),
+                   (1, None, list(range(10)), [20, 21, 22], [5, 20], 4.5), (1, "PI", None, None, None, None),
+                   (0, None, None, None, [13.5, 6], 3)]
+        for player_index, unit_type, valid_x, valid_y, location, radius in queries:
+            in_range = game_map.get_locations_in_range(location, radius) if radius is not None else list(game_map)
+            expected = []
+            for x, y in game_map:
+                if [x, y] in in_range and (valid_x is None or x in valid_x) and (valid_y is None or y in valid_y):
+                    expected.extend(unit for unit in game_map[x, y] if (player_index is None or unit.player_index == player_index) and (unit_type is None or unit.unit_type == unit_type))
+            self.assertEqual(expected, game_map.get_units(player_index, unit_type, valid_x, valid_y, location, radius))
+            self.assertEqual(sorted(set((unit.x, unit.y) for unit in expected)), sorted(tuple(location) for location in game_map.get_unit_locations(player_index, unit_type, valid_x, valid_y, location, radius)))
+
+        game_map.add_unit("FF", [10, 6], 0)
+        game_map.add_unit("FF", [11, 6], 0)
+        near = game_map.get_unit_locations(0, location=[13.5, 6], radius=3)
+        self.assertNotIn([10, 6], near, "[10, 6] is 3.5 away from [13.5, 6]")
+        self.assertIn([11, 6], near)
+
+    def test_range_stencils(self):
+        game_map = self.make_turn_0_map().game_map
+        game_map.enable_warnings = False
+        for location in [[13, 0], [0, 13], [20, 20], [5, 3], [13.5, 6], [27, 14]]:
+            for radius in [0, 1, 1.5, 2.5, 3, 3.5, 4.5, 9]:
+                expected = []
+                for i in range(int(location[0] - math.ceil(radius)), int(location[0] + math.ceil(radius) + 1)):
+                    for j in range(int(location[1] - math.ceil(radius)), int(location[1] + math.ceil(radius) + 1)):
+                        if game_map.in_arena_bounds([i, j]) and game_map.distance_between_locations(location, [i, j]) < radius + 0.01:
+                            expected.append([i, j])
+                self.assertEqual(expected, game_map.get_locations_in_range(location, radius), "Range differs around {} for radius {}".format(location, radius))
+                tiles = game_map.get_locations_in_range(location, radius, as_tile_ids=True)
+                all_locations = list(game_map)
+                self.assertEqual(expected, [all_locations[tile] for tile in tiles])
+
+    def test_tile_ids(self):
+        game = self.make_random_map(8, 0.3)
+        game_map = game.game_map
+        locations = list(game_map)
+        self.assertEqual(game_map.TILE_COUNT, len(locations))
+        for tile, location in enumerate(locations):
+            self.assertEqual(tile, game_map.get_tile_id(location))
+            self.assertEqual(location, game_map.get_tile_location(tile))
+        self.assertEqual(-1, game_map.get_tile_id([0, 0]), "Off board locations have no tile id")
+        self.assertEqual(-1, game_map.get_tile_id([13.5, 6]), "Locations between tiles have no tile id")
+        self.assertEqual(game_map.get_tile_id([13, 6]), game_map.get_tile_id([13.0, 6.0]))
+        for edge in range(4):
+            self.assertEqual([locations[tile] for tile in game_map.get_edge_tile_ids(edge)], game_map.get_edge_locations(edge))
+
+        for location in locations[::13]:
+            tile = game_map.get_tile_id(location)
+            self.assertEqual(game_map.get_locations_in_range(location, 3.5), game_map.get_locations_in_range(tile, 3.5))
+            self.assertEqual(game.get_attackers(location, 0), game.get_attackers(tile, 0))
+            self.assertEqual(game_map.get_threat(location, 1), game_map.get_threat(tile, 1))
+            path = game.find_path_to_edge(location)
+            tile_path = game.find_path_to_edge(tile)
+            self.assertEqual(path, None if tile_path is None else [locations[path_tile] for path_tile in tile_path], "Paths differ from {}".format(location))
+
+    def test_edge_membership(self):
+        game = self.make_turn_0_map()
+        game_map = game.game_map
+        edges = game_map.get_edges()
+        edges[0].append([0, 0])
+        self.assertEqual(14, len(game_map.get_edges()[0]), "Changing a returned edge list should not change the map's edges")
+        game_map.get_edge_locations(game_map.BOTTOM_LEFT)[0][0] = 5
+        self.assertEqual([13, 0], game_map.get_edge_locations(game_map.BOTTOM_LEFT)[0], "Changing a returned location should not change the map's edges")
+        self.assertTrue(game_map.is_on_edge([13, 0], game_map.BOTTOM_LEFT))
+        game_map.get_edges()[0][0][0] = 5
+        self.assertEqual(game_map.get_edge_locations(0), game_map.get_edges()[0], "Changing a location from get_edges should not change the map's edges")
+        self.assertNotIn(5, [location[0] for location in game_map.get_edges()[0]])
+        for location in game_map:
+            expected = [edge for edge in range(4) if location in game_map.get_edge_locations(edge)]
+            self.assertEqual(bool(expected), game_map.is_on_edge(location))
+            for edge in range(4):
+                self.assertEqual(edge in expected, game_map.is_on_edge(location, edge))
+        self.assertFalse(game_map.is_on_edge([0, 0]))
+        self.assertTrue(game.can_spawn("PI", [13, 0]))
+        self.assertFalse(game.can_spawn("PI", [13, 1]))
+        self.assertFalse(game.can_spawn("PI", [13.5, 0]), "Locations between tiles are not on an edge")
+        self.assertFalse(game_map.is_on_edge([13.5, 0]))
+
+    def test_map_iteration(self):
+        game = self.make_random_map(9, 0.1)
+        game_map = game.game_map
+        pairs = 0
+        for location in game_map:
+            for _ in game_map:
+                pairs += 1
+        self.assertEqual(420 * 420, pairs, "Nested loops over the map should not interfere")
+
+        game_map.add_unit("PI", [13, 0], 0)
+        expected = [location for location in game_map if len(game_map[location]) > 0]
+        self.assertEqual(expected, game_map.get_occupied_locations())
+        self.assertEqual([location for location in expected if game_map[location][0].player_index == 1], game_map.get_occupied_locations(1))
+
+    def test_bounds_table(self):
+        game_map = self.make_turn_0_map().game_map
+        xs = [x / 2 for x in range(-4, 60)]
+        ys = [y / 2 for y in range(-4, 60)]
+        xs, ys = [x for x in xs for _ in ys] + [13, 14, 0, 27, -1], [y for _ in xs for y in ys] + [0, 27, 13, 14, 13]
+        expected = []
+        for x, y in zip(xs, ys):
+            row_size = y + 1 if y < 14 else 28 - y
+            expected.append(14 - row_size <= x <= 13 + row_size)
+        self.assertEqual(expected, game_map.in_arena_bounds_many(xs, ys))
+        self.assertEqual(expected, [game_map.in_arena_bounds([x, y]) for x, y in zip(xs, ys)])
+
+    def test_fork(self):
+        game = self.make_random_map(10, 0.2)
+        game.game_map.get_threat([13, 13], 0)
+        before = [(location, [(unit.unit_type, unit.player_index, unit.upgraded) for unit in game.game_map[location]]) for location in game.game_map]
+        bits_before = game.game_map.get_structure_bits()
+        path_before = game.find_path_to_edge([13, 0])
+        threat_before = game.game_map.get_threat_map(0)
+
+        fork = game.fork()
+        structure_location = game.game_map.get_locations_from_bits(bits_before)[0]
+        fork.game_map.upgrade(structure_location)
+        fork.game_map.remove_unit(game.game_map.get_locations_from_bits(bits_before)[1])
+        fork.game_map.add_unit("DF", [13, 3], 0)
+        fork.game_map.add_unit("PI", [14, 0], 0)
+        fork.attempt_spawn("FF", [12, 3])
+        grandchild = fork.fork()
+        grandchild.game_map.remove_unit([13, 3])
+
+        after = [(location, [(unit.unit_type, unit.player_index, unit.upgraded) for unit in game.game_map[location]]) for location in game.game_map]
+        self.assertEqual(before, after, "Changing a fork should not change the original map")
+        self.assertEqual(bits_before, game.game_map.get_structure_bits())
+        self.assertEqual(path_before, game.find_path_to_edge([13, 0]))
+        self.assertEqual(threat_before, game.game_map.get_threat_map(0))
+        self.assertEqual([], game._build_stack)
+        self.assertTrue(fork.game_map[structure_location][0].upgraded)
+        self.assertTrue(fork.contains_stationary_unit([13, 3]))
+        self.assertFalse(grandchild.contains_stationary_unit([13, 3]))
+
+        fresh = self.make_random_map(10, 0.2)
+        for location in [[13, 3], [12, 3]] + game.game_map.get_locations_from_bits(bits_before)[:2]:
+            fresh.game_map.remove_unit(location)
+        fresh.game_map.add_unit("FF", [12, 3], 0)
+        fresh.game_map.add_unit("DF", [13, 3], 0)
+        fresh_type = game.game_map[structure_location][0].unit_type
+        fresh.game_map.remove_unit(structure_location)
+        fresh.game_map.add_unit(fresh_type, structure_location, game.game_map[structure_location][0].player_index)
+        fresh.game_map.upgrade(structure_location)
+        self.assertEqual(fresh.game_map.get_threat_map(1), fork.game_map.get_threat_map(1), "A fork's threat map should match a map built from scratch")
+
+    def describe_state(self, game):
+        units = [(location, [(unit.unit_type, unit.player_index, unit.upgraded, unit.health) for unit in game.game_map[location]]) for location in game.game_map]
+        return (units, game.game_map.get_layout_key(), game.game_map.get_threat_map(0), game.game_map.get_threat_map(1),
+                game.get_resource(game.SP), game.get_resource(game.MP), list(game._build_stack), list(game._deploy_stack))
+
+    def test_transactions(self):
+        game = self.make_random_map(12, 0.2)
+        game.game_map.get_threat([13, 13], 0)
+        before = self.describe_state(game)
+        structures = game.game_map.get_locations_from_bits(game.game_map.get_structure_bits(0))
+
+        with game.transaction():
+            game.attempt_spawn("DF", [[13, 2], [12, 3]])
+            game.attempt_upgrade(structures[0])
+            game.game_map.remove_unit(structures[1])
+            middle = self.describe_state(game)
+            with game.transaction():
+                game.attempt_spawn("PI", [13, 0], 2)
+                game.game_map.upgrade([13, 2])
+                game.game_map.remove_unit([12, 3])
+                self.assertNotEqual(middle, self.describe_state(game))
+            self.assertEqual(middle, self.describe_state(game), "The inner transaction should only undo its own changes")
+        self.assertEqual(before, self.describe_state(game), "Leaving a transaction should undo every change")
+        self.assertEqual(game.find_path_to_edge([13, 0]), self.make_random_map(12, 0.2).find_path_to_edge([13, 0]))
+
+        try:
+            with game.transaction():
+                game.game_map.add_unit("FF", [13, 5], 0)
+                raise ValueError()
+        except ValueError:
+            pass
+        self.assertEqual(before, self.describe_state(game), "Changes should be undone when the block raises")
+
+        fork = game.fork()
+        with fork.transaction():
+            fork.game_map.upgrade(structures[0])
+            fork.game_map.add_unit("FF", [13, 5], 0)
+        self.assertEqual(before, self.describe_state(fork))
+        self.assertEqual(before, self.describe_state(game))
+
+    def test_fork_inside_transaction(self):
+        game = self.make_random_map(12, 0.2)
+        game.game_map.get_threat([13, 13], 0)
+        before = self.describe_state(game)
+        structure = game.game_map.get_locations_from_bits(game.game_map.get_structure_bits(0))[0]
+        with game.transaction():
+            game.game_map.add_unit("FF", [13, 5], 0)
+            game.game_map.upgrade(structure)
+            fork = game.fork()
+        self.assertEqual(before, self.describe_state(game))
+
+        expected = self.make_random_map(12, 0.2)
+        expected.game_map.add_unit("FF", [13, 5], 0)
+        expected.game_map.upgrade(structure)
+        self.assertEqual(self.describe_state(expected), self.describe_state(fork), "Rolling back should not change a fork")
+        self.assertTrue(fork.game_map.is_blocked([13, 5]))
+        self.assertEqual(expected.game_map.get_structure_bits(), fork.game_map.get_structure_bits())
+        self.assertEqual(expected.game_map.get_upgraded_bits(), fork.game_map.get_upgraded_bits())
+        self.assertEqual(expected.game_map.get_hash(), fork.game_map.get_hash())
+
+    def test_board_hash(self):
+        game = self.make_random_map(13, 0.2)
+        game_map = game.game_map
+        self.assertEqual(game_map.get_hash(), self.make_random_map(13, 0.2).game_map.get_hash(), "Equal boards should hash equally")
+        self.assertNotEqual(game_map.get_hash(), self.make_random_map(14, 0.2).game_map.get_hash())
+        self.assertEqual(0, self.make_turn_0_map().game_map.get_hash())
+
+        start = game_map.get_hash()
+        game_map.add_unit("PI", [13, 0], 0)
+        one_scout = game_map.get_hash()
+        game_map.add_unit("PI", [13, 0], 0)
+        self.assertNotEqual(one_scout, game_map.get_hash(), "Stacked units should not cancel out")
+        game_map.remove_unit([13, 0])
+        self.assertEqual(start, game_map.get_hash())
+
+        structure = game_map.get_locations_from_bits(game_map.get_structure_bits())[0]
+        game_map.upgrade(structure)
+        self.assertNotEqual(start, game_map.get_hash(), "Upgrades should change the hash")
+        with game.transaction():
+            game_map.remove_unit(structure)
+        upgraded = game_map.get_hash()
+        rebuilt = self.make_random_map(13, 0.2)
+        rebuilt.game_map.upgrade(structure)
+        self.assertEqual(upgraded, rebuilt.game_map.get_hash())
+
+        turn = """{"p2Units":[[],[],[[13,20,60.0,"1"]],[],[],[],[],[[13,20,60.0,"2"]]],"turnInfo":[0,1,-1],"p1Stats":[30.0,25.0,5.0,0],"p1Units":[[[3,12,75.0,"3"]],[],[],[],[],[],[],[]],"p2Stats":[30.0,25.0,5.0,0],"events":{}}"""
+        parsed = GameState(game.config, turn)
+        built = self.make_turn_0_map()
+        built.game_map.add_unit("FF", [3, 12], 0)
+        built.game_map.add_unit("DF", [13, 20], 1)
+        built.game_map.upgrade([13, 20])
+        self.assertEqual(built.game_map.get_hash(), parsed.game_map.get_hash(), "Parsed and built boards should hash equally")
+
+    def test_decoded_state(self):
+        game = self.make_turn_0_map()
+        turn = """{"p2Units":[[],[],[[13,20,60.0,"1"]],[],[],[],[],[[13,20,60.0,"2"]]],"turnInfo":[0,4,-1],"p1Stats":[27.0,12.0,8.5,0],"p1Units":[[[3,12,75.0,"3"]],[],[],[],[],[],[],[]],"p2Stats":[30.0,25.0,5.0,0],"events":{}}"""
+        from_string = GameState(game.config, turn)
+        from_dict = GameState(game.config, json.loads(turn))
+        self.assertEqual(self.describe_state(from_string), self.describe_state(from_dict))
+        self.assertEqual(4, from_dict.turn_number)
+        self.assertEqual(27, from_dict.my_health)
+        self.assertEqual(8.5, from_dict.get_resource(from_dict.MP))
+        self.assertTrue(from_dict.game_map[13, 20][0].upgraded)
+
+    def test_decode_keys(self):
+        frame = """{"p2Units":[[],[],[[13,20,60.0,"events"]],[],[],[],[],[]],"turnInfo":[1,4,12],"p1Stats":[27.0,12.0,8.5,0],"p1Units":[[[3,12,75.0,"3"]],[],[],[],[],[],[],[]],"p2Stats":[30.0,25.0,5.0,0],"events" : {"breach":[[[24,10],1,3,"9",2]],"death":[]}}"""
+        full = json.loads(frame)
+        self.assertEqual({key: full[key] for key in ["events", "p1Units", "turnInfo"]}, decode_keys(frame, ["events", "p1Units", "turnInfo"]))
+        self.assertEqual({}, decode_keys(frame, ["endStats"]))
+        self.assertEqual({"p1Stats": [27.0, 12.0, 8.5, 0]}, decode_keys(frame, ["p1Stats"]))
+
+    def test_codec(self):
+        frame = codec.make_frame(3)
+        expected = json.loads(frame)
+        for name, (loads, dumps) in codec.BACKENDS.items():
+            self.assertEqual(expected, loads(frame), "{} should decode frames like json".format(name))
+            self.assertEqual(expected, json.loads(dumps(expected)), "{} should encode frames like json".format(name))
+        self.assertIn("json", codec.BACKENDS)
+        self.assertEqual(set(codec.BACKENDS), set(codec.benchmark(frame, number=1)))
+
+    def make_symmetric_map(self, seed, density):
+        game = self.make_turn_0_map()
+        rng = random.Random(seed)
+        for x, y in list(game.game_map):
+            if x < game.HALF_ARENA and rng.random() < density:
+                unit_type = rng.choice(["FF", "EF", "DF"])
+                player_index = 0 if y < game.HALF_ARENA else 1
+                game.game_map.add_unit(unit_type, [x, y], player_index)
+                game.game_map.add_unit(unit_type, [game.ARENA_SIZE - 1 - x, y], player_index)
+        return game
+
+    def test_mirrored_queries(self):
+        game = self.make_symmetric_map(11, 0.3)
+        self.assertEqual(game.game_map.get_layout_key(), game.game_map.get_layout_key(True), "Layout should be mirror symmetric")
+        finder = game._shortest_path_finder
+        searches = []
+        validate = finder._validate
+        finder._validate = lambda targets: searches.append(targets) or validate(targets)
+
+        game.find_path_to_edge([13, 0])
+        searches_for_first_path = len(searches)
+        mirrored_path = game.find_path_to_edge([14, 0])
+        self.assertEqual(searches_for_first_path, len(searches), "The mirrored path should reuse the reflected distance field")
+        expected = ShortestPathFinder().navigate_multiple_endpoints([14, 0], game.game_map.get_edge_locations(game.game_map.TOP_LEFT), game)
+        self.assertEqual(expected, mirrored_path)
+
+        game.get_attackers([10, 13], 0)
+        mirrored_attackers = game.get_attackers([17, 13], 0)
+        game._attacker_cache.clear()
+        self.assertEqual(game.get_attackers([17, 13], 0), mirrored_attackers, "Reflected attackers differ from a fresh search")
+
+    def test_evaluate_placements(self):
+        game = self.make_random_map(5, 0.2)
+        layout = game.game_map.get_layout_key()
+        candidates = [[13, 3], [12, 20], [10, 10]]
+        results = game.evaluate_placements(candidates, "DF")
+        self.assertEqual(layout, game.game_map.get_layout_key(), "Evaluating placements should not change the map")
+
+        for candidate, result in zip(candidates, results):
+            if game.contains_stationary_unit(candidate):
+                self.assertIsNone(result)
+                continue
+            game.game_map.add_unit("DF", candidate, 0 if candidate[1] < game.HALF_ARENA else 1)
+            for player_index, starts in enumerate([[[13, 0], [14, 0]], [[13, 27], [14, 27]]]):
+                for start, path, damage in zip(starts, result["paths"][player_index], result["path_damage"][player_index]):
+                    expected = None if game.contains_stationary_unit(start) else game.find_path_to_edge(start)
+                    self.assertEqual(expected, path, "Hypothetical path from {} differs".format(start))
+                    if path is not None:
+                        expected_damage = sum(unit.damage_i for location in path for unit in game.get_attackers(location, player_index))
+                        self.assertAlmostEqual(expected_damage, damage)
+            game.game_map.remove_unit(candidate)
+
+    def test_path_timing(self):
+        game = self.make_turn_0_map()
+        path = game.find_path_to_edge([13, 0])
+        self.assertEqual(list(range(len(path))), game.get_path_timing("PI", path), "Speed 1 units should move every frame")
+        self.assertEqual([0, 2, 4, 6], game.get_path_timing("EI", path)[:4], "Speed 0.5 units should move every other frame")
+        self.assertEqual([[0, 4, 8], None], game.get_paths_timing("SI", [path[:3], None]), "Every path should get its own timing")
+        tile_path = game.find_path_to_edge(game.game_map.get_tile_id([13, 0]))
+        self.assertEqual(list(range(len(tile_path))), game.get_path_timing("PI", tile_path), "Paths of tile ids should be timed too")
+        self.assertEqual([[0, 4, 8], [0, 4]], game.get_paths_timing("SI", [tile_path[:3], tile_path[:2]]))
+        self.assertEqual([[0, 4], [0, 4, 8]], game.get_paths_timing("SI", [tile_path[:2], tile_path[:3]]), "A two tile path should not be taken for a location")
+        self.assertIsNone(game.get_path_timing("FF", path), "Structures do not move")
+        self.assertIsNone(game.get_paths_timing("FF", [path]))
+        self.assertEqual(game.ARENA_SIZE * game.ARENA_SIZE, len(game.get_move_frames("EI")), "The move table should cover every path length")
+        self.assertEqual(game.get_path_timing("EI", path), game.get_move_frames("EI")[:len(path)])
+
+    def test_simulate_breach(self):
+        game = self.make_turn_0_map()
+        game.attempt_spawn("PI", [13, 0], 2)
+        layout = game.game_map.get_layout_key()
+        result = ActionSimulator(game).simulate()
+        self.assertEqual(layout, game.game_map.get_layout_key(), "Simulating should not change the game state")
+        self.assertEqual(["selfDestruct", "breach", "damage", "shield", "move", "spawn", "death", "attack", "melee"], list(result["events"]))
+        self.assertEqual(2, len(result["events"]["spawn"]))
+        self.assertEqual(2, len(result["events"]["breach"]), "Both scouts should reach the enemy edge of an empty board")
+        self.assertEqual(1, result["events"]["breach"][0][4], "Breaches by our units are reported as player 1")
+        self.assertEqual(game.enemy_health - 2, result["enemy_health"])
+        self.assertEqual(len(game.find_path_to_edge([13, 0])), len(result["frames"]), "A speed 1 unit should breach on the frame it reaches the edge")
+
+    def test_simulate_turret_defense(self):
+        game = self.make_turn_0_map()
+        for x in range(game.ARENA_SIZE):
+            if not x == 13:
+                game.game_map.add_unit("FF", [x, 14], 1)
+        for x in [11, 12, 14, 15]:
+            game.game_map.add_unit("DF", [x, 15], 1)
+        game.attempt_spawn("PI", [13, 0], 1)
+        result = ActionSimulator(game).simulate()
+        self.assertEqual(0, len(result["events"]["breach"]), "Our scout should not survive the turrets at the gap")
+        self.assertEqual([3, 1], [result["events"]["death"][0][1], result["events"]["death"][0][3]], "Our scout should die")
+        self.assertEqual(game.enemy_health, result["enemy_health"])
+
+    def test_simulate_blocked_spawn(self):
+        game = self.make_turn_0_map()
+        game.game_map.add_unit("FF", [13, 0], 0)
+        game.game_map.add_unit("PI", [13, 0], 0)
+        self.assertIsNone(game.find_path_to_edge([13, 0]))
+        result = ActionSimulator(game).simulate()
+        self.assertEqual(0, len(result["events"]["breach"]), "A unit without a path should not move")
+        self.assertEqual([3, 1], [result["events"]["death"][0][1], result["events"]["death"][0][3]], "A unit without a path should die")
+        self.assertEqual(game.enemy_health, result["enemy_health"])
+
     def test_print_unit(self):
         game = self.make_turn_0_map()
 